@@ -1,18 +1,133 @@
-from http.server import BaseHTTPRequestHandler
-import json
+import base64
+import mimetypes
 import os
-from urllib.parse import parse_qs, urlparse
+import threading
+import httpx
+import orjson
+import zstandard
+import mysql.connector
+from mysql.connector.conversion import MySQLConverter
+from urllib.parse import parse_qs, quote
+
+class JSONConverter(MySQLConverter):
+    """Pass JSON-typed columns through as raw JSON - the server already validated them"""
+    def _json_to_python(self, value, dsc=None):
+        return orjson.Fragment(value)
+
+    def _newdecimal_to_python(self, value, dsc=None):
+        # float keeps aggregates on orjson's native path (no default= callback)
+        return float(value)
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST"),
+    "port": int(os.getenv("DB_PORT", "4000")),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASSWORD"),
+    "database": os.getenv("DB_NAME"),
+    "ssl_disabled": False,
+    "converter_class": JSONConverter,
+    # Every write here is a single statement - no separate COMMIT round trip
+    "autocommit": True,
+}
+
+# Warm connection reused across invocations of the same container
+_conn = None
+
+# Server-side prepared statements on the warm connection, keyed by SQL text
+_prepared_cursors = {}
+
+# Held while a connection is being opened, so a request arriving during the
+# cold-start warm-up waits for that handshake instead of starting its own
+_conn_lock = threading.Lock()
 
 def get_db_connection():
-    import mysql.connector
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        port=int(os.getenv("DB_PORT", "4000")),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME"),
-        ssl_disabled=False,
+    global _conn
+    if _conn is not None and _conn.is_connected():
+        return _conn
+    with _conn_lock:
+        if _conn is not None and _conn.is_connected():
+            return _conn
+        _prepared_cursors.clear()
+        _conn = mysql.connector.connect(**DB_CONFIG)
+        return _conn
+
+def reset_db_connection():
+    """Drop the cached connection so the next call reconnects"""
+    global _conn
+    if _conn is not None:
+        try:
+            _conn.close()
+        except Exception:
+            pass
+    _conn = None
+    _prepared_cursors.clear()
+
+def get_prepared_cursor(sql):
+    """Reuse one prepared cursor per statement so repeat calls skip the server-side parse"""
+    conn = get_db_connection()
+    cursor = _prepared_cursors.get(sql)
+    if cursor is None:
+        cursor = conn.cursor(dictionary=True, prepared=True)
+        _prepared_cursors[sql] = cursor
+    return cursor
+
+# Optional HTTP SQL gateway (TiDB Serverless Data API / PlanetScale-style). Reads go
+# out as one HTTPS request on a kept-alive client instead of a MySQL handshake.
+DB_HTTP_URL = os.getenv("DB_HTTP_URL")
+_http_client = None
+
+# Columns typed JSON in MySQL - the gateway returns them as strings
+JSON_COLUMNS = {'suggestions', 'criteria', 'options', 'chart_data', 'document_ids'}
+
+def fetch_http(sql, params=None):
+    """Run a read query through the HTTP gateway: POST {sql, args} -> {"rows": [{...}]}"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(auth=(DB_CONFIG["user"] or "", DB_CONFIG["password"] or ""), timeout=10.0)
+    response = _http_client.post(
+        DB_HTTP_URL,
+        content=orjson.dumps({"sql": sql, "args": list(params or ()), "database": DB_CONFIG["database"]}),
+        headers={"Content-Type": "application/json"},
     )
+    response.raise_for_status()
+    return embed_json_fields(orjson.loads(response.content)["rows"], JSON_COLUMNS)
+
+def fetch_all(sql, params=None, prepared=False):
+    """Run a read query on the warm connection, reconnecting once if it went stale"""
+    if DB_HTTP_URL:
+        return fetch_http(sql, params)
+    for attempt in range(2):
+        try:
+            if prepared:
+                cursor = get_prepared_cursor(sql)
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(sql, params)
+            results = cursor.fetchall()
+            cursor.close()
+            return results
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            reset_db_connection()
+            if attempt:
+                raise
+
+# JSON-typed columns arrive as raw JSON via JSONConverter; these LONGTEXT
+# columns hold serialized JSON as plain text
+JSON_TEXT_FIELDS = {'result_json', 'answer_json'}
+
+def embed_json_fields(results, fields=JSON_TEXT_FIELDS):
+    """Mark stored JSON text so orjson embeds it verbatim instead of parsing and re-encoding it"""
+    for r in results:
+        for field in fields.intersection(r):
+            value = r[field]
+            if isinstance(value, bytes):
+                value = value.decode()
+            # Anything that isn't an object/array stays a plain JSON string
+            if isinstance(value, str) and value.lstrip()[:1] in ('{', '['):
+                r[field] = orjson.Fragment(value)
+    return results
 
 def check_env_vars():
     return {
@@ -22,9 +137,23 @@ def check_env_vars():
         "DB_PASSWORD": "SET" if os.getenv("DB_PASSWORD") else "NOT SET",
         "DB_NAME": "SET" if os.getenv("DB_NAME") else "NOT SET",
         "OPENROUTER_API_KEY": "SET" if os.getenv("OPENROUTER_API_KEY") else "NOT SET",
+        "DB_HTTP_URL": "SET" if DB_HTTP_URL else "NOT SET",
     }
 
+DOCS_WS_INDEX_EXISTS_SQL = """
+    SELECT 1 FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'documents' AND index_name = 'idx_docs_ws_created'
+    LIMIT 1
+"""
+DOCS_WS_INDEX_SQL = "CREATE INDEX idx_docs_ws_created ON documents (workspace_id, created_at DESC)"
+
+# Set once init_tables() has run in this container; repeat /init-db hits skip the DDL round trips
+_tables_initialized = False
+
 def init_tables():
+    global _tables_initialized
+    if _tables_initialized:
+        return
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -44,12 +173,27 @@ def init_tables():
             filename VARCHAR(255) NOT NULL,
             file_type VARCHAR(50) NOT NULL,
             file_size INT NOT NULL,
-            file_data LONGBLOB,
             suggestions JSON,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
     
+    # File contents are kept apart from document metadata; same DDL as the backend's SCHEMA_TABLES
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS document_blobs (
+            document_id INT PRIMARY KEY,
+            file_data LONGBLOB NOT NULL,
+            compression VARCHAR(8) NOT NULL DEFAULT 'none',
+            FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Serves the per-workspace document count in /workspaces. MySQL has no CREATE INDEX
+    # IF NOT EXISTS, so check information_schema first; same index as the backend creates.
+    cursor.execute(DOCS_WS_INDEX_EXISTS_SQL)
+    if not cursor.fetchall():
+        cursor.execute(DOCS_WS_INDEX_SQL)
+    
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS analysis_results (
             id INT AUTO_INCREMENT PRIMARY KEY,
@@ -101,206 +245,382 @@ def init_tables():
         )
     """)
     
-    conn.commit()
     cursor.close()
-    conn.close()
-
-class handler(BaseHTTPRequestHandler):
-    def send_json(self, data, status=200):
-        self.send_response(status)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, default=str).encode())
+    _tables_initialized = True
+
+ANALYSIS_SQL = "SELECT * FROM analysis_results WHERE document_id = %s ORDER BY created_at DESC"
+QA_HISTORY_SQL = "SELECT * FROM qa_history ORDER BY created_at DESC LIMIT %s"
+CHARTS_SQL = "SELECT * FROM charts WHERE document_id = %s ORDER BY created_at DESC"
+
+def _warm_connect():
+    """Open the connection and prepare the default /qa-history statement.
+
+    Both are published only once ready, under _conn_lock, so requests never
+    share the connection with this thread mid-handshake.
+    """
+    global _conn
+    with _conn_lock:
+        # A request that got the lock first has already connected
+        if _conn is not None and _conn.is_connected():
+            return
+        try:
+            conn = mysql.connector.connect(**DB_CONFIG)
+            cursor = conn.cursor(dictionary=True, prepared=True)
+            cursor.execute(QA_HISTORY_SQL, (10,))
+            cursor.fetchall()
+        except Exception:
+            return
+        _prepared_cursors.clear()
+        _prepared_cursors[QA_HISTORY_SQL] = cursor
+        _conn = conn
+
+# Overlap the handshake with the rest of cold-start init (route tables, the
+# runtime's own imports) on a background thread. Reads over the HTTP gateway
+# need no connection, so skip the handshake entirely.
+if not DB_HTTP_URL:
+    threading.Thread(target=_warm_connect, daemon=True).start()
+
+# ============ GET ROUTES ============
+# Each route takes (path, query) and returns (status, data) or
+# (status, data, extra_headers)
+
+def _h_health(path, query):
+    return 200, {"status": "ok", "env_vars": check_env_vars()}
+
+def _h_test_db(path, query):
+    try:
+        conn = get_db_connection()
+        conn.ping(reconnect=True)
+        return 200, {"status": "connected"}
+    except Exception as e:
+        return 200, {"status": "error", "message": str(e)}
+
+def _h_init_db(path, query):
+    try:
+        init_tables()
+        return 200, {"status": "tables created"}
+    except Exception as e:
+        return 200, {"status": "error", "message": str(e)}
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+class BadRequest(ValueError):
+    """Invalid client input - answered with a 400 and the message"""
+
+def int_param(query, name, default=None):
+    value = query.get(name, [None])[0]
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer")
+
+def page_params(query):
+    """Read ?limit=&offset=&after_id=; limit is clamped to 1..MAX_PAGE_SIZE and offset to >= 0"""
+    limit = min(max(int_param(query, 'limit', DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    offset = max(int_param(query, 'offset', 0), 0)
+    return limit, offset, int_param(query, 'after_id')
+
+def fetch_page(select, path, query):
+    """Run a newest-first list query one page at a time.
+
+    ?after_id= walks the primary key (keyset) and is preferred on large tables;
+    ?offset= is kept for simple clients. Returns (rows, Link header pairs).
+    """
+    limit, offset, after_id = page_params(query)
+    if after_id is not None:
+        results = fetch_all(f"{select} WHERE id < %s ORDER BY id DESC LIMIT %s", (after_id, limit))
+    else:
+        results = fetch_all(f"{select} ORDER BY id DESC LIMIT %s OFFSET %s", (limit, offset))
+    return results, page_links(path, results, limit, offset, after_id)
+
+def page_links(path, results, limit, offset, after_id):
+    links = []
+    if len(results) == limit:
+        links.append(f'<{path}?limit={limit}&after_id={results[-1]["id"]}>; rel="next"')
+    if after_id is None and offset > 0:
+        links.append(f'<{path}?limit={limit}&offset={max(offset - limit, 0)}>; rel="prev"')
+    if not links:
+        return []
+    return [(b"link", ", ".join(links).encode())]
+
+def _h_workspaces(path, query):
+    # Correlated count is an idx_docs_ws_created range lookup per workspace instead of
+    # a join + group-by over the whole documents table
+    results, headers = fetch_page("""
+        SELECT id, name, description, created_at,
+            (SELECT COUNT(*) FROM documents d WHERE d.workspace_id = w.id) as document_count
+        FROM workspaces w""", path, query)
+    return 200, results, headers
+
+def _h_documents(path, query):
+    results, headers = fetch_page(
+        "SELECT id, filename, file_type, file_size, workspace_id, suggestions, created_at FROM documents",
+        path, query)
+    return 200, results, headers
+
+def _h_analysis(path, query):
+    doc_id = path.split('/')[-1]
+    results = fetch_all(ANALYSIS_SQL, (doc_id,), prepared=True)
+    return 200, embed_json_fields(results)
+
+def _h_qa_history(path, query):
+    limit = min(max(int_param(query, 'limit', 10), 1), MAX_PAGE_SIZE)
+    results = fetch_all(QA_HISTORY_SQL, (limit,), prepared=True)
+    return 200, embed_json_fields(results)
+
+def _h_comparisons(path, query):
+    results = fetch_all("SELECT * FROM comparisons ORDER BY created_at DESC")
+    return 200, embed_json_fields(results)
+
+def _h_decision_matrices(path, query):
+    results = fetch_all("SELECT * FROM decision_matrices ORDER BY created_at DESC")
+    return 200, embed_json_fields(results)
+
+def _h_charts(path, query):
+    doc_id = path.split('/')[-1]
+    return 200, fetch_all(CHARTS_SQL, (doc_id,), prepared=True)
+
+class RawBody:
+    """Route result sent verbatim as a stream of byte chunks instead of JSON"""
+    def __init__(self, chunks, content_type, headers=()):
+        self.chunks = chunks
+        self.content_type = content_type
+        self.headers = headers
+
+# file_data is read in slices with SUBSTRING so a large blob is never held whole;
+# zstd-compressed blobs (written by the backend) are decompressed as the slices arrive
+FILE_CHUNK_SIZE = 1024 * 1024
+FILE_CHUNK_SQL = "SELECT SUBSTRING(file_data, %s, %s) AS chunk FROM document_blobs WHERE document_id = %s"
+# The HTTP gateway answers in JSON, which can't carry raw bytes - ask for base64 text instead
+FILE_CHUNK_HTTP_SQL = "SELECT TO_BASE64(SUBSTRING(file_data, %s, %s)) AS chunk FROM document_blobs WHERE document_id = %s"
+
+# Metadata and blob info in one lookup, before any response is started; compression is NULL without a blob row
+FILE_INFO_SQL = """
+    SELECT d.filename, d.file_size, b.compression, LENGTH(b.file_data) AS stored_size
+    FROM documents d LEFT JOIN document_blobs b ON b.document_id = d.id
+    WHERE d.id = %s
+"""
+
+def iter_document_file(doc_id, compression, stored_size):
+    decoder = zstandard.ZstdDecompressor().decompressobj() if compression == "zstd" else None
+    chunk_sql = FILE_CHUNK_HTTP_SQL if DB_HTTP_URL else FILE_CHUNK_SQL
+    for start in range(1, int(stored_size) + 1, FILE_CHUNK_SIZE):
+        rows = fetch_all(chunk_sql, (start, FILE_CHUNK_SIZE, doc_id))
+        if not rows or not rows[0]["chunk"]:
+            return
+        # TO_BASE64 wraps its output every 76 characters; b64decode skips the newlines
+        chunk = base64.b64decode(rows[0]["chunk"]) if DB_HTTP_URL else bytes(rows[0]["chunk"])
+        data = decoder.decompress(chunk) if decoder else chunk
+        if data:
+            yield data
+
+def content_disposition(filename):
+    """RFC 6266 attachment header: an ASCII fallback name plus the exact UTF-8 name"""
+    fallback = filename.encode("ascii", "replace").decode().replace("\\", "_").replace('"', "_")
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}".encode()
+
+def _h_document_file(path, query):
+    parts = path.strip('/').split('/')
+    if len(parts) != 3 or parts[2] != 'file' or not parts[1].isdigit():
+        return 404, {"error": "Endpoint not found"}
+    doc_id = int(parts[1])
+    rows = fetch_all(FILE_INFO_SQL, (doc_id,))
+    if not rows:
+        return 404, {"error": "Document not found"}
+    info = rows[0]
+    if info["compression"] is None:
+        return 404, {"error": "File not found"}
+    filename = info["filename"]
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    headers = [
+        (b"content-length", str(info["file_size"]).encode()),
+        (b"content-disposition", content_disposition(filename)),
+    ]
+    return 200, RawBody(iter_document_file(doc_id, info["compression"], info["stored_size"]), content_type, headers)
+
+def _h_root(path, query):
+    return 200, {"message": "AnalysisDoc API"}
+
+ROUTES = {
+    '/health': _h_health,
+    '/test-db': _h_test_db,
+    '/init-db': _h_init_db,
+    '/workspaces': _h_workspaces,
+    '/documents': _h_documents,
+    '/qa-history': _h_qa_history,
+    '/comparisons': _h_comparisons,
+    '/decision-matrices': _h_decision_matrices,
+}
+
+PREFIX_ROUTES = (
+    ('/analysis/', _h_analysis),
+    ('/charts/', _h_charts),
+    ('/documents/', _h_document_file),
+)
+
+# ============ POST ROUTES ============
+# Each route takes (path, data) and returns (status, data)
+
+def _p_workspaces(path, data):
+    # Only the cursor is scoped to the request; the connection stays warm
+    conn = get_db_connection()
+    with conn.cursor() as cursor:
+        cursor.execute("INSERT INTO workspaces (name, description) VALUES (%s, %s)", 
+                     (data.get('name'), data.get('description')))
+        workspace_id = cursor.lastrowid
+    return 200, {"id": workspace_id, "name": data.get('name')}
+
+def _not_available(message):
+    def route(path, data):
+        return 501, {"error": message}
+    return route
+
+POST_ROUTES = {
+    '/workspaces': _p_workspaces,
+    # For now, return a placeholder - file upload needs multipart handling
+    '/upload': _not_available("File upload not supported in serverless mode. Use local development."),
+    '/analyze': _not_available("Analysis not available in free tier due to timeout limits"),
+    '/compare': _not_available("Comparison not available in free tier due to timeout limits"),
+    '/decision-matrix': _not_available("Decision matrix not available in free tier due to timeout limits"),
+    '/qa': _not_available("Q&A not available in free tier due to timeout limits"),
+    '/charts': _not_available("Chart generation not available in free tier due to timeout limits"),
+}
+
+def _p_not_found(path, data):
+    return 404, {"error": "Endpoint not found"}
+
+# ============ ASGI APP ============
+
+# Constant response headers, built once
+_JSON_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-expose-headers", b"link"),
+]
+
+# CORS preflight never varies, so both messages are built once. Max-Age lets
+# browsers cache the preflight instead of repeating it before every call.
+_OPTIONS_START = {
+    "type": "http.response.start",
+    "status": 200,
+    "headers": [
+        (b"access-control-allow-origin", b"*"),
+        (b"access-control-allow-methods", b"GET, POST, PUT, DELETE, OPTIONS"),
+        (b"access-control-allow-headers", b"*"),
+        (b"access-control-max-age", b"86400"),
+        (b"content-length", b"0"),
+    ],
+}
+_EMPTY_BODY = {"type": "http.response.body", "body": b""}
+
+async def send_json(send, data, status=200, extra_headers=()):
+    body = orjson.dumps(data)
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [*_JSON_HEADERS, (b"content-length", str(len(body)).encode()), *extra_headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def send_json_rows(send, rows, status=200, extra_headers=()):
+    """Stream a list row by row so large LONGTEXT results are never joined into one buffer"""
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [*_JSON_HEADERS, *extra_headers],
+    })
+    await send({"type": "http.response.body", "body": b"[", "more_body": True})
+    separator = b""
+    for row in rows:
+        await send({"type": "http.response.body", "body": separator + orjson.dumps(row), "more_body": True})
+        separator = b","
+    await send({"type": "http.response.body", "body": b"]"})
+
+async def send_raw(send, body, status=200, extra_headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", body.content_type.encode()),
+            (b"access-control-allow-origin", b"*"),
+            *body.headers,
+            *extra_headers,
+        ],
+    })
+    try:
+        for chunk in body.chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    except Exception:
+        # The 200 is already out, so there's no JSON error to send. Leaving the body
+        # unfinished makes the server drop the connection: the client sees a truncated
+        # download instead of a short file that looks complete.
+        return
+    await send(_EMPTY_BODY)
+
+async def get_body(receive):
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    body = b"".join(chunks)
+    if body:
+        return orjson.loads(body)
+    return {}
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # The warm connection lives for the whole container; close it only here
+            reset_db_connection()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    """ASGI entry point served by the Vercel Python runtime (or uvicorn locally)"""
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
     
-    def get_body(self):
-        content_length = int(self.headers.get('Content-Length', 0))
-        if content_length:
-            return json.loads(self.rfile.read(content_length))
-        return {}
+    method = scope["method"]
+    path = scope["path"]
     
-    def do_GET(self):
-        parsed = urlparse(self.path)
-        path = parsed.path
-        query = parse_qs(parsed.query)
+    try:
+        if method == "GET":
+            query = parse_qs(scope["query_string"].decode())
+            route = ROUTES.get(path)
+            if route is None:
+                route = next((h for prefix, h in PREFIX_ROUTES if path.startswith(prefix)), _h_root)
+            status, data, *headers = route(path, query)
         
-        try:
-            if path == '/health':
-                self.send_json({"status": "ok", "env_vars": check_env_vars()})
-            
-            elif path == '/test-db':
-                try:
-                    conn = get_db_connection()
-                    conn.close()
-                    self.send_json({"status": "connected"})
-                except Exception as e:
-                    self.send_json({"status": "error", "message": str(e)})
-            
-            elif path == '/init-db':
-                try:
-                    init_tables()
-                    self.send_json({"status": "tables created"})
-                except Exception as e:
-                    self.send_json({"status": "error", "message": str(e)})
-            
-            elif path == '/workspaces':
-                conn = get_db_connection()
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute("""
-                    SELECT w.*, COUNT(d.id) as document_count 
-                    FROM workspaces w LEFT JOIN documents d ON w.id = d.workspace_id 
-                    GROUP BY w.id ORDER BY w.id DESC
-                """)
-                results = cursor.fetchall()
-                cursor.close()
-                conn.close()
-                self.send_json(results)
-            
-            elif path == '/documents':
-                conn = get_db_connection()
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute("SELECT id, filename, file_type, file_size, workspace_id, suggestions, created_at FROM documents ORDER BY id DESC")
-                results = cursor.fetchall()
-                cursor.close()
-                conn.close()
-                for r in results:
-                    if r.get('suggestions'):
-                        try:
-                            r['suggestions'] = json.loads(r['suggestions'])
-                        except:
-                            pass
-                self.send_json(results)
-            
-            elif path.startswith('/analysis/'):
-                doc_id = path.split('/')[-1]
-                conn = get_db_connection()
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute("SELECT * FROM analysis_results WHERE document_id = %s ORDER BY created_at DESC", (doc_id,))
-                results = cursor.fetchall()
-                cursor.close()
-                conn.close()
-                for r in results:
-                    if r.get('result_json'):
-                        try:
-                            r['result_json'] = json.loads(r['result_json'])
-                        except:
-                            pass
-                self.send_json(results)
-            
-            elif path == '/qa-history':
-                limit = query.get('limit', ['10'])[0]
-                conn = get_db_connection()
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute(f"SELECT * FROM qa_history ORDER BY created_at DESC LIMIT {int(limit)}")
-                results = cursor.fetchall()
-                cursor.close()
-                conn.close()
-                for r in results:
-                    if r.get('answer_json'):
-                        try:
-                            r['answer_json'] = json.loads(r['answer_json'])
-                        except:
-                            pass
-                self.send_json(results)
-            
-            elif path == '/comparisons':
-                conn = get_db_connection()
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute("SELECT * FROM comparisons ORDER BY created_at DESC")
-                results = cursor.fetchall()
-                cursor.close()
-                conn.close()
-                for r in results:
-                    if r.get('result_json'):
-                        try:
-                            r['result_json'] = json.loads(r['result_json'])
-                        except:
-                            pass
-                self.send_json(results)
-            
-            elif path == '/decision-matrices':
-                conn = get_db_connection()
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute("SELECT * FROM decision_matrices ORDER BY created_at DESC")
-                results = cursor.fetchall()
-                cursor.close()
-                conn.close()
-                for r in results:
-                    for field in ['criteria', 'options', 'result_json']:
-                        if r.get(field):
-                            try:
-                                r[field] = json.loads(r[field])
-                            except:
-                                pass
-                self.send_json(results)
-            
-            elif path.startswith('/charts/'):
-                doc_id = path.split('/')[-1]
-                conn = get_db_connection()
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute("SELECT * FROM charts WHERE document_id = %s ORDER BY created_at DESC", (doc_id,))
-                results = cursor.fetchall()
-                cursor.close()
-                conn.close()
-                for r in results:
-                    if r.get('chart_data'):
-                        try:
-                            r['chart_data'] = json.loads(r['chart_data'])
-                        except:
-                            pass
-                self.send_json(results)
-            
-            else:
-                self.send_json({"message": "AnalysisDoc API"})
+        elif method == "POST":
+            data = await get_body(receive)
+            status, data, *headers = POST_ROUTES.get(path, _p_not_found)(path, data)
         
-        except Exception as e:
-            self.send_json({"error": str(e)}, 500)
-    
-    def do_POST(self):
-        parsed = urlparse(self.path)
-        path = parsed.path
-        
-        try:
-            if path == '/workspaces':
-                data = self.get_body()
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO workspaces (name, description) VALUES (%s, %s)", 
-                             (data.get('name'), data.get('description')))
-                workspace_id = cursor.lastrowid
-                conn.commit()
-                cursor.close()
-                conn.close()
-                self.send_json({"id": workspace_id, "name": data.get('name')})
-            
-            elif path == '/upload':
-                # For now, return a placeholder - file upload needs multipart handling
-                self.send_json({"error": "File upload not supported in serverless mode. Use local development."}, 501)
-            
-            elif path == '/analyze':
-                self.send_json({"error": "Analysis not available in free tier due to timeout limits"}, 501)
-            
-            elif path == '/compare':
-                self.send_json({"error": "Comparison not available in free tier due to timeout limits"}, 501)
-            
-            elif path == '/decision-matrix':
-                self.send_json({"error": "Decision matrix not available in free tier due to timeout limits"}, 501)
-            
-            elif path == '/qa':
-                self.send_json({"error": "Q&A not available in free tier due to timeout limits"}, 501)
-            
-            elif path == '/charts':
-                self.send_json({"error": "Chart generation not available in free tier due to timeout limits"}, 501)
-            
-            else:
-                self.send_json({"error": "Endpoint not found"}, 404)
+        elif method == "OPTIONS":
+            await send(_OPTIONS_START)
+            await send(_EMPTY_BODY)
+            return
         
-        except Exception as e:
-            self.send_json({"error": str(e)}, 500)
+        else:
+            status, data, headers = 405, {"error": "Method not allowed"}, []
+    
+    except BadRequest as e:
+        status, data, headers = 400, {"error": str(e)}, []
+    except Exception as e:
+        status, data, headers = 500, {"error": str(e)}, []
     
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', '*')
-        self.end_headers()
+    extra_headers = headers[0] if headers else ()
+    if isinstance(data, RawBody):
+        await send_raw(send, data, status, extra_headers)
+    elif isinstance(data, list):
+        await send_json_rows(send, data, status, extra_headers)
+    else:
+        await send_json(send, data, status, extra_headers)
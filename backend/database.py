@@ -1,8 +1,18 @@
 """Database connection and models for MySQL - Full Version with Workspaces"""
 import os
-import json
+import hashlib
+import orjson
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
 import mysql.connector
+import zstandard
+from mysql.connector import pooling
+from mysql.connector.constants import ClientFlag
 from dotenv import load_dotenv
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
 
 load_dotenv()
 
@@ -19,55 +29,261 @@ DB_CONFIG = {
     "password": os.getenv("DB_PASSWORD", ""),
     "port": int(os.getenv("DB_PORT", "3306")),
     "autocommit": True,
+    # C extension (bundled in the wheel) - the pure-Python protocol path costs far more CPU per row
+    "use_pure": False,
+    # rowcount reports matched rows, so an UPDATE alone tells us whether the row exists
+    "client_flags": [ClientFlag.FOUND_ROWS],
 }
 
 # Add SSL for cloud databases (TiDB, PlanetScale, etc.)
 if IS_PRODUCTION or os.getenv("DB_SSL", "").lower() == "true":
     DB_CONFIG["ssl_disabled"] = False
 
+# Bounded pool shared by all requests - conn.close() hands the connection back.
+# Sized to the app's request concurrency; mysql-connector caps pools at 32.
+POOL_SIZE = min(int(os.getenv("DB_POOL_SIZE", "15")), pooling.CNX_POOL_MAXSIZE)
+# Waits before retrying a pool checkout/creation; after the last one we give up
+POOL_RETRY_DELAYS = (0.05, 0.25)
+# Physical connections older than this are reopened on checkout, before a server
+# wait_timeout or proxy idle cutoff can kill them mid-request
+POOL_RECYCLE_SECS = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+_pool = None
+_pool_lock = threading.Lock()
+
+class DatabaseUnavailable(RuntimeError):
+    """No pooled connection could be obtained - the API answers 503 instead of opening raw connections"""
+
+def init_pool():
+    """Create the connection pool once per process"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Sessions carry no per-request state (autocommit, no session variables),
+                # so skip the COM_RESET_CONNECTION round trip on every checkout
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name="analysisdoc",
+                    pool_size=POOL_SIZE,
+                    pool_reset_session=False,
+                    **DB_CONFIG,
+                )
+    return _pool
+
+def close_pool():
+    """Close every idle pooled connection - called on app shutdown"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool._remove_connections()
+            _pool = None
+
+def _recycle_if_stale(conn):
+    """Reopen the physical connection once it is older than POOL_RECYCLE_SECS.
+    The pool itself already pings (is_connected) and reconnects dead connections on checkout."""
+    cnx = conn._cnx
+    now = time.monotonic()
+    born = getattr(cnx, "_born_at", None)
+    if born is None:
+        cnx._born_at = now
+    elif now - born > POOL_RECYCLE_SECS:
+        try:
+            cnx.reconnect(attempts=2, delay=0)
+        except mysql.connector.Error:
+            conn.close()
+            raise
+        cnx._born_at = now
+    return conn
+
 def get_connection():
-    """Get a database connection"""
+    """Get a database connection from the pool, retrying briefly; never opens connections outside it"""
+    for delay in (*POOL_RETRY_DELAYS, None):
+        try:
+            return _recycle_if_stale(init_pool().get_connection())
+        except mysql.connector.Error as e:
+            # PoolError = every connection checked out; anything else = the pool couldn't be built
+            if delay is None:
+                print(f"Database connection error: {e}")
+                raise DatabaseUnavailable(str(e)) from e
+            time.sleep(delay)
+
+@contextmanager
+def db_cursor(dictionary=False):
+    """Yield a cursor on a pooled connection and always release both.
+    Connections autocommit, so single-statement writes need no COMMIT round trip -
+    use db_transaction when several statements must succeed together."""
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=dictionary)
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        raise
+        yield cursor
+    finally:
+        cursor.close()
+        conn.close()
 
-def init_database():
-    """Initialize database - creates tables only if they don't exist"""
-    print("Initializing database...")
+# Explicit projections - list/metadata reads never drag LONGBLOB or unused columns over the wire
+DOCUMENT_COLUMNS = "id, filename, file_type, file_size, file_sha256, workspace_id, suggestions, created_at"
+WORKSPACE_COLUMNS = "id, name, description, created_at, updated_at"
+ANALYSIS_COLUMNS = "id, document_id, analysis_type, result_json, created_at"
+COMPARISON_COLUMNS = "id, workspace_id, document_ids, result_json, created_at"
+DECISION_MATRIX_COLUMNS = "id, workspace_id, name, criteria, options, result_json, created_at"
+CHART_COLUMNS = "id, document_id, chart_type, title, chart_data, created_at"
+QA_COLUMNS = "id, workspace_id, document_ids, question, answer_json, created_at"
+
+# Keyset pagination: newest first, resuming strictly after the last (created_at, id) the client saw.
+# id breaks ties, so a batch inserted within one second is never split or skipped between pages;
+# a cursor without an id (before_id=0) falls back to "strictly older than before".
+DEFAULT_PAGE_SIZE = 50
+PAGE_CLAUSE = "(%s IS NULL OR (created_at, id) < (%s, %s)) ORDER BY created_at DESC, id DESC LIMIT %s"
+
+def _page(before, before_id, limit):
+    return (before, before, before_id or 0, limit)
+
+class SQL:
+    """Every statement, built once at import. Passing the same string object each call
+    keeps the prepared-cursor cache keyed on one entry per statement, so each hot
+    statement is COM_STMT_PREPAREd once per connection rather than parsed per call."""
+    # Workspaces
+    CREATE_WORKSPACE = "INSERT INTO workspaces (name, description) VALUES (%s, %s)"
+    LIST_WORKSPACES = """
+        SELECT w.id, w.name, w.description, w.created_at, w.updated_at, COUNT(d.id) as document_count
+        FROM workspaces w LEFT JOIN documents d ON w.id = d.workspace_id
+        GROUP BY w.id ORDER BY w.created_at DESC
+    """
+    GET_WORKSPACE = f"SELECT {WORKSPACE_COLUMNS} FROM workspaces WHERE id = %s"
+    UPDATE_WORKSPACE = "UPDATE workspaces SET name = COALESCE(%s, name), description = COALESCE(%s, description) WHERE id = %s"
+    DELETE_WORKSPACE = "DELETE FROM workspaces WHERE id = %s"
+    # Only rows that actually move match, so rowcount stays "newly assigned" under FOUND_ROWS
+    ASSIGN_ALL_DOCUMENTS = "UPDATE documents SET workspace_id = %s WHERE workspace_id IS NULL OR workspace_id <> %s"
+    # Placeholder count varies with the number of workspaces - filled in per call
+    WORKSPACES_DOCUMENTS = "SELECT id, filename, file_type, file_size, workspace_id, created_at FROM documents WHERE workspace_id IN ({placeholders}) ORDER BY created_at DESC"
+    # Documents
+    SAVE_DOCUMENT = "INSERT INTO documents (filename, file_type, file_size, file_sha256, workspace_id) VALUES (%s, %s, %s, %s, %s)"
+    SAVE_DOCUMENT_BLOB = "INSERT INTO document_blobs (document_id, file_data, compression) VALUES (%s, %s, %s)"
+    GET_DOCUMENT = f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE id = %s"
+    GET_DOCUMENT_FULL = "SELECT d.id, d.filename, d.file_type, d.file_size, d.file_sha256, d.workspace_id, d.suggestions, d.created_at, b.file_data, b.compression FROM documents d LEFT JOIN document_blobs b ON b.document_id = d.id WHERE d.id = %s"
+    GET_DOCUMENTS_FULL = "SELECT d.id, d.filename, d.file_type, d.file_size, d.file_sha256, d.workspace_id, d.suggestions, d.created_at, b.file_data, b.compression FROM documents d LEFT JOIN document_blobs b ON b.document_id = d.id WHERE d.id IN ({placeholders})"
+    GET_DOCUMENT_BYTES = "SELECT file_data, compression FROM document_blobs WHERE document_id = %s"
+    GET_BLOB_INFO = "SELECT compression, LENGTH(file_data) FROM document_blobs WHERE document_id = %s"
+    GET_BLOB_SLICE = "SELECT SUBSTRING(file_data, %s, %s) FROM document_blobs WHERE document_id = %s"
+    LIST_DOCUMENTS = f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE {PAGE_CLAUSE}"
+    LIST_WORKSPACE_DOCUMENTS = f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE workspace_id = %s ORDER BY created_at DESC, id DESC"
+    PAGE_WORKSPACE_DOCUMENTS = f"SELECT {DOCUMENT_COLUMNS} FROM documents WHERE workspace_id = %s AND {PAGE_CLAUSE}"
+    DELETE_DOCUMENT = "DELETE FROM documents WHERE id = %s"
+    UPDATE_DOCUMENT_SUGGESTIONS = "UPDATE documents SET suggestions = %s WHERE id = %s"
+    UPDATE_DOCUMENT_WORKSPACE = "UPDATE documents SET workspace_id = %s WHERE id = %s"
+    UPDATE_DOCUMENT_SHA256 = "UPDATE documents SET file_sha256 = %s WHERE id = %s"
+    GET_CACHED_SUGGESTIONS = "SELECT suggestions FROM suggestions_cache WHERE content_hash = %s AND model = %s"
+    SAVE_CACHED_SUGGESTIONS = "INSERT INTO suggestions_cache (content_hash, model, suggestions) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE suggestions = VALUES(suggestions), created_at = CURRENT_TIMESTAMP"
+    # Analysis
+    SAVE_ANALYSIS = "INSERT INTO analysis_results (document_id, analysis_type, result_json) VALUES (%s, %s, %s)"
+    LIST_ANALYSES = f"SELECT {ANALYSIS_COLUMNS} FROM analysis_results WHERE document_id = %s AND {PAGE_CLAUSE}"
+    ALL_ANALYSES = f"SELECT {ANALYSIS_COLUMNS} FROM analysis_results WHERE document_id = %s ORDER BY created_at DESC"
+    # Comparisons
+    SAVE_COMPARISON = "INSERT INTO comparisons (workspace_id, document_ids, result_json) VALUES (%s, %s, %s)"
+    SAVE_COMPARISON_DOCUMENT = "INSERT IGNORE INTO comparison_documents (comparison_id, document_id) VALUES (%s, %s)"
+    COMPARISONS_FOR_DOCUMENT = f"""
+        SELECT {", ".join("c." + col for col in COMPARISON_COLUMNS.split(", "))}
+        FROM comparison_documents cd JOIN comparisons c ON c.id = cd.comparison_id
+        WHERE cd.document_id = %s ORDER BY c.created_at DESC LIMIT %s
+    """
+    LIST_COMPARISONS = f"SELECT {COMPARISON_COLUMNS} FROM comparisons WHERE {PAGE_CLAUSE}"
+    LIST_WORKSPACE_COMPARISONS = f"SELECT {COMPARISON_COLUMNS} FROM comparisons WHERE workspace_id = %s AND {PAGE_CLAUSE}"
+    # Decision matrices
+    SAVE_DECISION_MATRIX = "INSERT INTO decision_matrices (workspace_id, name, criteria, options, result_json) VALUES (%s, %s, %s, %s, %s)"
+    LIST_DECISION_MATRICES = f"SELECT {DECISION_MATRIX_COLUMNS} FROM decision_matrices WHERE {PAGE_CLAUSE}"
+    LIST_WORKSPACE_DECISION_MATRICES = f"SELECT {DECISION_MATRIX_COLUMNS} FROM decision_matrices WHERE workspace_id = %s AND {PAGE_CLAUSE}"
+    # Charts
+    SAVE_CHART = "INSERT INTO charts (document_id, chart_type, title, chart_data) VALUES (%s, %s, %s, %s)"
+    LIST_CHARTS = f"SELECT {CHART_COLUMNS} FROM charts WHERE document_id = %s AND {PAGE_CLAUSE}"
+    # Q&A
+    SAVE_QA = "INSERT INTO qa_history (workspace_id, document_ids, question, answer_json) VALUES (%s, %s, %s, %s)"
+    SAVE_QA_DOCUMENT = "INSERT IGNORE INTO qa_documents (qa_id, document_id) VALUES (%s, %s)"
+    QA_FOR_DOCUMENT = f"""
+        SELECT {", ".join("q." + col for col in QA_COLUMNS.split(", "))}
+        FROM qa_documents qd JOIN qa_history q ON q.id = qd.qa_id
+        WHERE qd.document_id = %s ORDER BY q.created_at DESC LIMIT %s
+    """
+    LIST_QA = f"SELECT {QA_COLUMNS} FROM qa_history ORDER BY created_at DESC LIMIT %s"
+    LIST_WORKSPACE_QA = f"SELECT {QA_COLUMNS} FROM qa_history WHERE workspace_id = %s ORDER BY created_at DESC LIMIT %s"
+
+PREPARED_CACHE_SIZE = 128
+
+def _prepared_cursor(conn, sql, dictionary):
+    """Reuse one prepared cursor per statement on each physical connection.
+
+    Closing a prepared cursor deallocates its server-side statement, so these
+    stay open for the connection's lifetime and survive pool checkouts.
+    """
+    cnx = getattr(conn, "_cnx", conn)
+    cache = getattr(cnx, "_prepared_cursors", None)
+    # A reconnect (pool ping failure or recycle) gives a new session whose statement ids are unknown
+    if cache is None or getattr(cnx, "_prepared_session", None) != cnx.connection_id:
+        cache = cnx._prepared_cursors = OrderedDict()
+        cnx._prepared_session = cnx.connection_id
+    key = (sql, dictionary)
+    cursor = cache.get(key)
+    if cursor is None:
+        cursor = conn.cursor(prepared=True, dictionary=dictionary)
+        cache[key] = cursor
+        if len(cache) > PREPARED_CACHE_SIZE:
+            cache.popitem(last=False)[1].close()
+    else:
+        cache.move_to_end(key)
+    return cursor
+
+@contextmanager
+def db_prepared(sql, dictionary=False):
+    """Like db_cursor, but yields a cached prepared cursor for sql"""
+    conn = get_connection()
+    try:
+        yield _prepared_cursor(conn, sql, dictionary)
+    finally:
+        conn.close()
+
+@contextmanager
+def db_transaction():
+    """Yield a pooled connection inside an explicit transaction; roll back on error"""
     conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Workspaces table
-    cursor.execute("""
+    try:
+        conn.start_transaction()
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+SCHEMA_TABLES = {
+    "workspaces": """
         CREATE TABLE IF NOT EXISTS workspaces (
             id INT AUTO_INCREMENT PRIMARY KEY,
             name VARCHAR(255) NOT NULL,
             description TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-    """)
-    
+        )""",
     # Documents table with suggestions
-    cursor.execute("""
+    "documents": """
         CREATE TABLE IF NOT EXISTS documents (
             id INT AUTO_INCREMENT PRIMARY KEY,
             workspace_id INT,
             filename VARCHAR(255) NOT NULL,
             file_type VARCHAR(50) NOT NULL,
             file_size INT NOT NULL,
-            file_data LONGBLOB NOT NULL,
+            file_sha256 CHAR(64),
             suggestions JSON,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (workspace_id) REFERENCES workspaces(id) ON DELETE SET NULL
-        )
-    """)
-    
-    # Analysis results
-    cursor.execute("""
+        )""",
+    # File contents live apart from the metadata so list scans never touch blob pages
+    "document_blobs": """
+        CREATE TABLE IF NOT EXISTS document_blobs (
+            document_id INT PRIMARY KEY,
+            file_data LONGBLOB NOT NULL,
+            compression VARCHAR(8) NOT NULL DEFAULT 'none',
+            FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+        )""",
+    "analysis_results": """
         CREATE TABLE IF NOT EXISTS analysis_results (
             id INT AUTO_INCREMENT PRIMARY KEY,
             document_id INT NOT NULL,
@@ -75,11 +291,8 @@ def init_database():
             result_json LONGTEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
-        )
-    """)
-    
-    # Comparisons
-    cursor.execute("""
+        )""",
+    "comparisons": """
         CREATE TABLE IF NOT EXISTS comparisons (
             id INT AUTO_INCREMENT PRIMARY KEY,
             workspace_id INT,
@@ -87,11 +300,18 @@ def init_database():
             result_json LONGTEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (workspace_id) REFERENCES workspaces(id) ON DELETE SET NULL
-        )
-    """)
-    
-    # Decision matrices
-    cursor.execute("""
+        )""",
+    # Which documents a comparison covers - indexed both ways for reverse lookups
+    "comparison_documents": """
+        CREATE TABLE IF NOT EXISTS comparison_documents (
+            comparison_id INT NOT NULL,
+            document_id INT NOT NULL,
+            PRIMARY KEY (comparison_id, document_id),
+            KEY idx_cmpdoc_document (document_id),
+            FOREIGN KEY (comparison_id) REFERENCES comparisons(id) ON DELETE CASCADE,
+            FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+        )""",
+    "decision_matrices": """
         CREATE TABLE IF NOT EXISTS decision_matrices (
             id INT AUTO_INCREMENT PRIMARY KEY,
             workspace_id INT,
@@ -101,11 +321,8 @@ def init_database():
             result_json LONGTEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (workspace_id) REFERENCES workspaces(id) ON DELETE SET NULL
-        )
-    """)
-    
-    # Charts
-    cursor.execute("""
+        )""",
+    "charts": """
         CREATE TABLE IF NOT EXISTS charts (
             id INT AUTO_INCREMENT PRIMARY KEY,
             document_id INT NOT NULL,
@@ -114,11 +331,9 @@ def init_database():
             chart_data JSON NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
-        )
-    """)
-    
+        )""",
     # Q&A history
-    cursor.execute("""
+    "qa_history": """
         CREATE TABLE IF NOT EXISTS qa_history (
             id INT AUTO_INCREMENT PRIMARY KEY,
             workspace_id INT,
@@ -127,262 +342,521 @@ def init_database():
             answer_json LONGTEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (workspace_id) REFERENCES workspaces(id) ON DELETE SET NULL
-        )
-    """)
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
+        )""",
+    "qa_documents": """
+        CREATE TABLE IF NOT EXISTS qa_documents (
+            qa_id INT NOT NULL,
+            document_id INT NOT NULL,
+            PRIMARY KEY (qa_id, document_id),
+            KEY idx_qadoc_document (document_id),
+            FOREIGN KEY (qa_id) REFERENCES qa_history(id) ON DELETE CASCADE,
+            FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+        )""",
+    # Upload suggestions by file contents + model, so re-uploading the same bytes skips the model call
+    "suggestions_cache": """
+        CREATE TABLE IF NOT EXISTS suggestions_cache (
+            content_hash CHAR(64) NOT NULL,
+            model VARCHAR(255) NOT NULL,
+            suggestions JSON NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (content_hash, model)
+        )""",
+}
+
+# Backfill for junction tables created on a database that already has rows: (parent rows, link INSERT).
+# The JSON document_ids columns stay the source the API returns; these make reverse lookups indexable.
+# The arrays are expanded in Python because TiDB has no JSON_TABLE.
+JUNCTION_BACKFILL = {
+    "comparison_documents": ("SELECT id, document_ids FROM comparisons", SQL.SAVE_COMPARISON_DOCUMENT),
+    "qa_documents": ("SELECT id, document_ids FROM qa_history WHERE document_ids IS NOT NULL", SQL.SAVE_QA_DOCUMENT),
+}
+# Links per executemany batch - keeps each multi-row INSERT well under max_allowed_packet
+BULK_CHUNK_SIZE = 1000
+
+def _backfill_junctions(cursor, names):
+    """Link existing comparisons / Q&A rows to the documents their document_ids still name"""
+    cursor.execute("SELECT id FROM documents")
+    existing = {row[0] for row in cursor.fetchall()}
+    for name in names:
+        select_sql, insert_sql = JUNCTION_BACKFILL[name]
+        cursor.execute(select_sql)
+        links = [
+            (parent_id, doc_id)
+            for parent_id, ids_json in cursor.fetchall()
+            for doc_id in orjson.loads(ids_json or "[]")
+            if doc_id in existing
+        ]
+        for start in range(0, len(links), BULK_CHUNK_SIZE):
+            cursor.executemany(insert_sql, links[start:start + BULK_CHUNK_SIZE])
+
+def stream_rows(sql, params=()):
+    """Yield dict rows one at a time from an unbuffered cursor - constant memory for LONGTEXT-heavy reads"""
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    try:
+        cursor.execute(sql, params)
+        for row in cursor:
+            yield row
+    finally:
+        # Drain anything the consumer didn't read so the connection goes back to the pool clean
+        conn.consume_results()
+        cursor.close()
+        conn.close()
+
+# MySQL has no CREATE INDEX IF NOT EXISTS, so init_database checks information_schema first
+LIST_INDEXES = {
+    "idx_ar_doc_created": "CREATE INDEX idx_ar_doc_created ON analysis_results (document_id, created_at DESC)",
+    "idx_ch_doc_created": "CREATE INDEX idx_ch_doc_created ON charts (document_id, created_at DESC)",
+    "idx_cmp_ws_created": "CREATE INDEX idx_cmp_ws_created ON comparisons (workspace_id, created_at DESC)",
+    "idx_qa_ws_created": "CREATE INDEX idx_qa_ws_created ON qa_history (workspace_id, created_at DESC)",
+    # The serverless handler (api/index.py) creates this same index - keep the two definitions in step
+    "idx_docs_ws_created": "CREATE INDEX idx_docs_ws_created ON documents (workspace_id, created_at DESC)",
+}
+
+# One round-trip describing everything init_database may need to create or migrate
+SCHEMA_STATE_SQL = """
+    SELECT 'table', table_name FROM information_schema.tables WHERE table_schema = DATABASE()
+    UNION ALL
+    SELECT DISTINCT 'index', index_name FROM information_schema.statistics WHERE table_schema = DATABASE()
+    UNION ALL
+    SELECT 'column', CONCAT(table_name, '.', column_name) FROM information_schema.columns
+    WHERE table_schema = DATABASE() AND (
+        (table_name = 'documents' AND column_name = 'file_data')
+        OR (table_name = 'document_blobs' AND column_name = 'compression')
+        OR (table_name = 'documents' AND column_name = 'file_sha256')
+    )
+"""
+
+def _run_script(cursor, statements):
+    """Send several statements in one multi-statement round-trip"""
+    for _ in cursor.execute(";\n".join(statements), multi=True):
+        pass
+
+def init_database():
+    """Initialize database - creates tables only if they don't exist"""
+    print("Initializing database...")
+    with db_cursor() as cursor:
+        cursor.execute(SCHEMA_STATE_SQL)
+        state = {"table": set(), "index": set(), "column": set()}
+        for kind, name in cursor.fetchall():
+            state[kind].add(name)
+        
+        # Tables are created in dependency order, all in one batch
+        missing = [ddl for name, ddl in SCHEMA_TABLES.items() if name not in state["table"]]
+        if missing:
+            print(f"Creating {len(missing)} table(s)...")
+            _run_script(cursor, missing)
+            backfill = [name for name in JUNCTION_BACKFILL if name not in state["table"]]
+            if backfill and state["table"]:
+                _backfill_junctions(cursor, backfill)
+        
+        # document_blobs predating compression support - existing rows are stored raw
+        if "document_blobs" in state["table"] and "document_blobs.compression" not in state["column"]:
+            print("Adding document_blobs.compression...")
+            cursor.execute("ALTER TABLE document_blobs ADD COLUMN compression VARCHAR(8) NOT NULL DEFAULT 'none'")
+        
+        # Content hash used to key cached model responses; older rows get it lazily
+        if "documents" in state["table"] and "documents.file_sha256" not in state["column"]:
+            print("Adding documents.file_sha256...")
+            cursor.execute("ALTER TABLE documents ADD COLUMN file_sha256 CHAR(64) AFTER file_size")
+        
+        # Older databases kept file_data on documents - move it over once
+        if "documents.file_data" in state["column"]:
+            print("Migrating documents.file_data into document_blobs...")
+            _run_script(cursor, [
+                "INSERT IGNORE INTO document_blobs (document_id, file_data) SELECT id, file_data FROM documents WHERE file_data IS NOT NULL",
+                "ALTER TABLE documents DROP COLUMN file_data",
+            ])
+        
+        # Composite indexes for the "WHERE fk = ? ORDER BY created_at DESC" list queries
+        missing = [ddl for name, ddl in LIST_INDEXES.items() if name not in state["index"]]
+        if missing:
+            print(f"Creating {len(missing)} index(es)...")
+            _run_script(cursor, missing)
     print("Database initialized - tables ready")
 
+# ============ READ CACHE ============
+# Dashboard renders re-read the same lists; serve them from memory for a few seconds
+_read_cache = TTLCache(maxsize=256, ttl=5)
+_read_cache_lock = threading.Lock()
+
+def _read_cached(func):
+    return cached(_read_cache, key=lambda *args, **kwargs: hashkey(func.__name__, *args, **kwargs), lock=_read_cache_lock)(func)
+
+def invalidate_read_cache():
+    """Drop cached list results after a write"""
+    with _read_cache_lock:
+        _read_cache.clear()
+
+# Per-document metadata (no blob) - every analysis endpoint looks its document up first
+_document_cache = TTLCache(maxsize=1024, ttl=60)
+
+def forget_documents(*doc_ids):
+    """Drop cached metadata for these documents, or for all of them when none are given"""
+    with _read_cache_lock:
+        if not doc_ids:
+            _document_cache.clear()
+        for doc_id in doc_ids:
+            _document_cache.pop(doc_id, None)
+
 # ============ WORKSPACE OPERATIONS ============
 def create_workspace(name: str, description: str = None) -> int:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO workspaces (name, description) VALUES (%s, %s)", (name, description))
-    workspace_id = cursor.lastrowid
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_cursor() as cursor:
+        cursor.execute(SQL.CREATE_WORKSPACE, (name, description))
+        workspace_id = cursor.lastrowid
+    invalidate_read_cache()
     return workspace_id
 
+@_read_cached
 def get_workspaces():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT w.*, COUNT(d.id) as document_count 
-        FROM workspaces w LEFT JOIN documents d ON w.id = d.workspace_id 
-        GROUP BY w.id ORDER BY w.created_at DESC
-    """)
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return results
+    with db_cursor(dictionary=True) as cursor:
+        cursor.execute(SQL.LIST_WORKSPACES)
+        return cursor.fetchall()
+
+def get_workspaces_with_documents():
+    """Workspaces with their documents attached - two queries instead of 1+N"""
+    # Copy the (possibly cached) rows before attaching documents to them
+    workspaces = [dict(w) for w in get_workspaces()]
+    if not workspaces:
+        return workspaces
+    ids = [w["id"] for w in workspaces]
+    placeholders = ", ".join(["%s"] * len(ids))
+    with db_cursor(dictionary=True) as cursor:
+        cursor.execute(
+            SQL.WORKSPACES_DOCUMENTS.format(placeholders=placeholders),
+            ids
+        )
+        docs = cursor.fetchall()
+    by_workspace = defaultdict(list)
+    for doc in docs:
+        by_workspace[doc["workspace_id"]].append(doc)
+    for workspace in workspaces:
+        workspace["documents"] = by_workspace[workspace["id"]]
+    return workspaces
 
 def get_workspace(workspace_id: int):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM workspaces WHERE id = %s", (workspace_id,))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return result
-
-def update_workspace(workspace_id: int, name: str = None, description: str = None):
-    conn = get_connection()
-    cursor = conn.cursor()
-    if name and description is not None:
-        cursor.execute("UPDATE workspaces SET name = %s, description = %s WHERE id = %s", (name, description, workspace_id))
-    elif name:
-        cursor.execute("UPDATE workspaces SET name = %s WHERE id = %s", (name, workspace_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_cursor(dictionary=True) as cursor:
+        cursor.execute(SQL.GET_WORKSPACE, (workspace_id,))
+        return cursor.fetchone()
+
+def update_workspace(workspace_id: int, name: str = None, description: str = None) -> int:
+    """Update whichever fields are given; returns 0 when the workspace doesn't exist"""
+    sql = SQL.UPDATE_WORKSPACE
+    with db_prepared(sql) as cursor:
+        cursor.execute(sql, (name or None, description, workspace_id))
+        count = cursor.rowcount
+    invalidate_read_cache()
+    return count
 
 def delete_workspace(workspace_id: int):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM workspaces WHERE id = %s", (workspace_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_cursor() as cursor:
+        cursor.execute(SQL.DELETE_WORKSPACE, (workspace_id,))
+    invalidate_read_cache()
+    forget_documents()
 
 def assign_all_documents_to_workspace(workspace_id: int):
     """Assign all documents to a specific workspace"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE documents SET workspace_id = %s", (workspace_id,))
-    affected = cursor.rowcount
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return affected
+    with db_cursor() as cursor:
+        cursor.execute(SQL.ASSIGN_ALL_DOCUMENTS, (workspace_id, workspace_id))
+        count = cursor.rowcount
+    invalidate_read_cache()
+    forget_documents()
+    return count
 
 # ============ DOCUMENT OPERATIONS ============
-def save_document(filename: str, file_type: str, file_size: int, file_data: bytes, workspace_id: int = None) -> int:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO documents (filename, file_type, file_size, file_data, workspace_id) VALUES (%s, %s, %s, %s, %s)",
-        (filename, file_type, file_size, file_data, workspace_id)
-    )
-    doc_id = cursor.lastrowid
-    conn.commit()
-    cursor.close()
-    conn.close()
+# Blobs are stored zstd-compressed when that actually shrinks them; DOCX/XLSX and most PDFs
+# are already deflated, so those stay raw. (zstandard objects aren't thread-safe - one per call.)
+BLOB_COMPRESSION_LEVEL = 3
+
+def _pack_blob(data: bytes):
+    packed = zstandard.ZstdCompressor(level=BLOB_COMPRESSION_LEVEL).compress(data)
+    if len(packed) < len(data):
+        return packed, "zstd"
+    return data, "none"
+
+def _unpack_blob(data, compression: str):
+    if data is None:
+        return None
+    data = bytes(data)
+    return zstandard.ZstdDecompressor().decompress(data) if compression == "zstd" else data
+
+def save_document(filename: str, file_type: str, file_size: int, file_data: bytes, workspace_id: int = None, sha256: str = None) -> int:
+    doc_sql = SQL.SAVE_DOCUMENT
+    blob_sql = SQL.SAVE_DOCUMENT_BLOB
+    blob, compression = _pack_blob(file_data)
+    sha256 = sha256 or hashlib.sha256(file_data).hexdigest()
+    with db_transaction() as conn:
+        cursor = _prepared_cursor(conn, doc_sql, False)
+        cursor.execute(doc_sql, (filename, file_type, file_size, sha256, workspace_id))
+        doc_id = cursor.lastrowid
+        _prepared_cursor(conn, blob_sql, False).execute(blob_sql, (doc_id, blob, compression))
+    invalidate_read_cache()
     return doc_id
 
+# Cap on blob bytes per multi-row INSERT, well under the server's max_allowed_packet (64MB default)
+BULK_BLOB_BYTES = 16 * 1024 * 1024
+
+def save_documents_bulk(rows: list) -> list:
+    """rows: (filename, file_type, file_size, file_data, workspace_id, sha256) per file.
+    Saves them all in one transaction and returns the new ids in the same order."""
+    # Compress and hash before checking out a connection so it is held only for the round trips
+    packed = [
+        (filename, file_type, file_size, sha256 or hashlib.sha256(file_data).hexdigest(), workspace_id, _pack_blob(file_data))
+        for filename, file_type, file_size, file_data, workspace_id, sha256 in rows
+    ]
+    doc_sql = SQL.SAVE_DOCUMENT
+    doc_ids = []
+    with db_transaction() as conn:
+        cursor = _prepared_cursor(conn, doc_sql, False)
+        # One INSERT per row: lastrowid is the only reliable way to pair each file with its id
+        for filename, file_type, file_size, sha256, workspace_id, _ in packed:
+            cursor.execute(doc_sql, (filename, file_type, file_size, sha256, workspace_id))
+            doc_ids.append(cursor.lastrowid)
+        # Blobs go in as few multi-row INSERTs as the packet budget allows
+        blob_cursor = conn.cursor()
+        batch, batch_bytes = [], 0
+        for doc_id, (*_, (blob, compression)) in zip(doc_ids, packed):
+            if batch and batch_bytes + len(blob) > BULK_BLOB_BYTES:
+                blob_cursor.executemany(SQL.SAVE_DOCUMENT_BLOB, batch)
+                batch, batch_bytes = [], 0
+            batch.append((doc_id, blob, compression))
+            batch_bytes += len(blob)
+        if batch:
+            blob_cursor.executemany(SQL.SAVE_DOCUMENT_BLOB, batch)
+    invalidate_read_cache()
+    return doc_ids
+
 def get_document(doc_id: int):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM documents WHERE id = %s", (doc_id,))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return result
-
-def get_all_documents():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id, filename, file_type, file_size, workspace_id, suggestions, created_at FROM documents ORDER BY created_at DESC")
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return results
-
-def get_documents_by_workspace(workspace_id: int):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id, filename, file_type, file_size, workspace_id, suggestions, created_at FROM documents WHERE workspace_id = %s ORDER BY created_at DESC", (workspace_id,))
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return results
+    """Document metadata without the file contents (cached per id)"""
+    with _read_cache_lock:
+        doc = _document_cache.get(doc_id)
+    if doc is None:
+        with db_cursor(dictionary=True) as cursor:
+            cursor.execute(SQL.GET_DOCUMENT, (doc_id,))
+            doc = cursor.fetchone()
+        if doc is None:
+            return None
+        with _read_cache_lock:
+            _document_cache[doc_id] = doc
+    # Callers get their own copy so the cached row stays pristine
+    return dict(doc)
+
+def get_document_full(doc_id: int):
+    """Metadata plus file_data - only for callers that actually process the file"""
+    sql = SQL.GET_DOCUMENT_FULL
+    with db_prepared(sql, dictionary=True) as cursor:
+        cursor.execute(sql, (doc_id,))
+        # Drain the result so the cached cursor is clean for its next execute
+        rows = cursor.fetchall()
+    if not rows:
+        return None
+    doc = rows[0]
+    doc["file_data"] = _unpack_blob(doc["file_data"], doc.pop("compression"))
+    return doc
+
+def get_documents_full(doc_ids: list) -> dict:
+    """Several documents with file_data in one query, as {id: doc}; missing ids are simply absent"""
+    ids = list(dict.fromkeys(doc_ids))
+    if not ids:
+        return {}
+    with db_cursor(dictionary=True) as cursor:
+        cursor.execute(SQL.GET_DOCUMENTS_FULL.format(placeholders=", ".join(["%s"] * len(ids))), ids)
+        rows = cursor.fetchall()
+    for doc in rows:
+        doc["file_data"] = _unpack_blob(doc["file_data"], doc.pop("compression"))
+    return {doc["id"]: doc for doc in rows}
+
+def get_document_bytes(doc_id: int):
+    """Only the stored file contents, or None"""
+    with db_cursor() as cursor:
+        cursor.execute(SQL.GET_DOCUMENT_BYTES, (doc_id,))
+        row = cursor.fetchone()
+    return _unpack_blob(*row) if row else None
+
+def get_blob_info(doc_id: int):
+    """(compression, stored size) of a document's file, or None when no blob is stored"""
+    with db_cursor() as cursor:
+        cursor.execute(SQL.GET_BLOB_INFO, (doc_id,))
+        return cursor.fetchone()
+
+def get_document_stream(doc_id: int, compression: str, stored_size: int, chunk: int = 1 << 20):
+    """Yield the file in chunks read with SUBSTRING so the whole blob is never in memory.
+    Each slice checks a connection out and straight back in, so a slow client never pins one."""
+    decoder = zstandard.ZstdDecompressor().decompressobj() if compression == "zstd" else None
+    for pos in range(1, stored_size + 1, chunk):
+        with db_prepared(SQL.GET_BLOB_SLICE) as cursor:
+            cursor.execute(SQL.GET_BLOB_SLICE, (pos, chunk, doc_id))
+            rows = cursor.fetchall()
+        if not rows or not rows[0][0]:
+            # Blob deleted mid-download - fail loudly rather than end a short body quietly
+            raise RuntimeError(f"Blob for document {doc_id} vanished during download")
+        data = decoder.decompress(bytes(rows[0][0])) if decoder else bytes(rows[0][0])
+        if data:
+            yield data
+
+@_read_cached
+def get_all_documents(limit: int = DEFAULT_PAGE_SIZE, before=None, before_id=None):
+    with db_cursor(dictionary=True) as cursor:
+        cursor.execute(SQL.LIST_DOCUMENTS, _page(before, before_id, limit))
+        return cursor.fetchall()
+
+@_read_cached
+def get_documents_by_workspace(workspace_id: int, limit: int = None, before=None, before_id=None):
+    """A workspace's documents, newest first; every one of them unless a page limit is given"""
+    with db_cursor(dictionary=True) as cursor:
+        if limit is None:
+            cursor.execute(SQL.LIST_WORKSPACE_DOCUMENTS, (workspace_id,))
+        else:
+            cursor.execute(SQL.PAGE_WORKSPACE_DOCUMENTS, (workspace_id, *_page(before, before_id, limit)))
+        return cursor.fetchall()
 
 def delete_document(doc_id: int):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM documents WHERE id = %s", (doc_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_cursor() as cursor:
+        cursor.execute(SQL.DELETE_DOCUMENT, (doc_id,))
+    invalidate_read_cache()
+    forget_documents(doc_id)
 
-def update_document_suggestions(doc_id: int, suggestions: str):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE documents SET suggestions = %s WHERE id = %s", (suggestions, doc_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+def update_document_suggestions(doc_id: int, suggestions: str) -> int:
+    sql = SQL.UPDATE_DOCUMENT_SUGGESTIONS
+    with db_prepared(sql) as cursor:
+        cursor.execute(sql, (suggestions, doc_id))
+        count = cursor.rowcount
+    invalidate_read_cache()
+    forget_documents(doc_id)
+    return count
 
-def update_document_workspace(doc_id: int, workspace_id: int):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE documents SET workspace_id = %s WHERE id = %s", (workspace_id, doc_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+def get_cached_suggestions(content_hash: str, model: str):
+    """Stored suggestions JSON for these exact file contents and model, or None"""
+    with db_cursor() as cursor:
+        cursor.execute(SQL.GET_CACHED_SUGGESTIONS, (content_hash, model))
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+def save_cached_suggestions(content_hash: str, model: str, suggestions: str):
+    with db_cursor() as cursor:
+        cursor.execute(SQL.SAVE_CACHED_SUGGESTIONS, (content_hash, model, suggestions))
+
+def update_document_sha256(doc_id: int, sha256: str):
+    """Backfill the content hash for documents saved before file_sha256 existed"""
+    with db_cursor() as cursor:
+        cursor.execute(SQL.UPDATE_DOCUMENT_SHA256, (sha256, doc_id))
+    forget_documents(doc_id)
+
+def update_document_workspace(doc_id: int, workspace_id: int) -> int:
+    """Returns 0 when the document doesn't exist - no SELECT precheck needed"""
+    sql = SQL.UPDATE_DOCUMENT_WORKSPACE
+    with db_prepared(sql) as cursor:
+        cursor.execute(sql, (workspace_id, doc_id))
+        count = cursor.rowcount
+    invalidate_read_cache()
+    forget_documents(doc_id)
+    return count
 
 # ============ ANALYSIS OPERATIONS ============
 def save_analysis(document_id: int, analysis_type: str, result_json: str) -> int:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO analysis_results (document_id, analysis_type, result_json) VALUES (%s, %s, %s)",
-        (document_id, analysis_type, result_json)
-    )
-    analysis_id = cursor.lastrowid
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return analysis_id
+    sql = SQL.SAVE_ANALYSIS
+    with db_prepared(sql) as cursor:
+        cursor.execute(sql, (document_id, analysis_type, result_json))
+        return cursor.lastrowid
 
-def get_analysis_by_document(document_id: int):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM analysis_results WHERE document_id = %s ORDER BY created_at DESC", (document_id,))
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return results
+def get_analysis_by_document(document_id: int, limit: int = DEFAULT_PAGE_SIZE, before=None, before_id=None):
+    with db_cursor(dictionary=True) as cursor:
+        cursor.execute(SQL.LIST_ANALYSES, (document_id, *_page(before, before_id, limit)))
+        return cursor.fetchall()
+
+def iter_analysis_by_document(document_id: int):
+    return stream_rows(SQL.ALL_ANALYSES, (document_id,))
 
 # ============ COMPARISON OPERATIONS ============
 def save_comparison(document_ids: list, result_json: str, workspace_id: int = None) -> int:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO comparisons (workspace_id, document_ids, result_json) VALUES (%s, %s, %s)",
-        (workspace_id, json.dumps(document_ids), result_json)
-    )
-    comparison_id = cursor.lastrowid
-    conn.commit()
-    cursor.close()
-    conn.close()
+    # Serialize before checking out a connection so it is held only for the round trips
+    ids_json = orjson.dumps(document_ids).decode()
+    with db_transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL.SAVE_COMPARISON, (workspace_id, ids_json, result_json))
+        comparison_id = cursor.lastrowid
+        cursor.executemany(
+            SQL.SAVE_COMPARISON_DOCUMENT,
+            [(comparison_id, doc_id) for doc_id in document_ids]
+        )
+        cursor.close()
     return comparison_id
 
-def get_comparisons(workspace_id: int = None):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    if workspace_id:
-        cursor.execute("SELECT * FROM comparisons WHERE workspace_id = %s ORDER BY created_at DESC", (workspace_id,))
-    else:
-        cursor.execute("SELECT * FROM comparisons ORDER BY created_at DESC")
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return results
+def get_comparisons_for_document(document_id: int, limit: int = DEFAULT_PAGE_SIZE):
+    """Comparisons that include a document - an index lookup on comparison_documents"""
+    with db_cursor(dictionary=True) as cursor:
+        cursor.execute(SQL.COMPARISONS_FOR_DOCUMENT, (document_id, limit))
+        return cursor.fetchall()
+
+def get_comparisons(workspace_id: int = None, limit: int = DEFAULT_PAGE_SIZE, before=None, before_id=None):
+    with db_cursor(dictionary=True) as cursor:
+        if workspace_id:
+            cursor.execute(SQL.LIST_WORKSPACE_COMPARISONS, (workspace_id, *_page(before, before_id, limit)))
+        else:
+            cursor.execute(SQL.LIST_COMPARISONS, _page(before, before_id, limit))
+        return cursor.fetchall()
 
 # ============ DECISION MATRIX OPERATIONS ============
 def save_decision_matrix(name: str, criteria: list, options: list, result_json: str = None, workspace_id: int = None) -> int:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO decision_matrices (workspace_id, name, criteria, options, result_json) VALUES (%s, %s, %s, %s, %s)",
-        (workspace_id, name, json.dumps(criteria), json.dumps(options), result_json)
-    )
-    matrix_id = cursor.lastrowid
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return matrix_id
+    params = (workspace_id, name, orjson.dumps(criteria).decode(), orjson.dumps(options).decode(), result_json)
+    with db_cursor() as cursor:
+        cursor.execute(SQL.SAVE_DECISION_MATRIX, params)
+        return cursor.lastrowid
 
-def get_decision_matrices(workspace_id: int = None):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    if workspace_id:
-        cursor.execute("SELECT * FROM decision_matrices WHERE workspace_id = %s ORDER BY created_at DESC", (workspace_id,))
-    else:
-        cursor.execute("SELECT * FROM decision_matrices ORDER BY created_at DESC")
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return results
+def get_decision_matrices(workspace_id: int = None, limit: int = DEFAULT_PAGE_SIZE, before=None, before_id=None):
+    with db_cursor(dictionary=True) as cursor:
+        if workspace_id:
+            cursor.execute(SQL.LIST_WORKSPACE_DECISION_MATRICES, (workspace_id, *_page(before, before_id, limit)))
+        else:
+            cursor.execute(SQL.LIST_DECISION_MATRICES, _page(before, before_id, limit))
+        return cursor.fetchall()
 
 # ============ CHART OPERATIONS ============
 def save_chart(document_id: int, chart_type: str, title: str, chart_data: dict) -> int:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO charts (document_id, chart_type, title, chart_data) VALUES (%s, %s, %s, %s)",
-        (document_id, chart_type, title, json.dumps(chart_data))
-    )
-    chart_id = cursor.lastrowid
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return chart_id
+    sql = SQL.SAVE_CHART
+    params = (document_id, chart_type, title, orjson.dumps(chart_data).decode())
+    with db_prepared(sql) as cursor:
+        cursor.execute(sql, params)
+        return cursor.lastrowid
 
-def get_charts_by_document(document_id: int):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM charts WHERE document_id = %s ORDER BY created_at DESC", (document_id,))
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return results
+def get_charts_by_document(document_id: int, limit: int = DEFAULT_PAGE_SIZE, before=None, before_id=None):
+    sql = SQL.LIST_CHARTS
+    with db_prepared(sql, dictionary=True) as cursor:
+        cursor.execute(sql, (document_id, *_page(before, before_id, limit)))
+        return cursor.fetchall()
 
 # ============ Q&A OPERATIONS ============
 def save_qa(question: str, answer_json: str, document_ids: list = None, workspace_id: int = None) -> int:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO qa_history (workspace_id, document_ids, question, answer_json) VALUES (%s, %s, %s, %s)",
-        (workspace_id, json.dumps(document_ids) if document_ids else None, question, answer_json)
-    )
-    qa_id = cursor.lastrowid
-    conn.commit()
-    cursor.close()
-    conn.close()
+    sql = SQL.SAVE_QA
+    ids_json = orjson.dumps(document_ids).decode() if document_ids else None
+    with db_transaction() as conn:
+        cursor = _prepared_cursor(conn, sql, False)
+        cursor.execute(sql, (workspace_id, ids_json, question, answer_json))
+        qa_id = cursor.lastrowid
+        if document_ids:
+            cursor = conn.cursor()
+            cursor.executemany(
+                SQL.SAVE_QA_DOCUMENT,
+                [(qa_id, doc_id) for doc_id in document_ids]
+            )
+            cursor.close()
     return qa_id
 
+def get_qa_for_document(document_id: int, limit: int = DEFAULT_PAGE_SIZE):
+    """Q&A entries that referenced a document - an index lookup on qa_documents"""
+    with db_cursor(dictionary=True) as cursor:
+        cursor.execute(SQL.QA_FOR_DOCUMENT, (document_id, limit))
+        return cursor.fetchall()
+
 def get_qa_history(workspace_id: int = None, limit: int = 50):
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+    with db_cursor(dictionary=True) as cursor:
+        if workspace_id:
+            cursor.execute(SQL.LIST_WORKSPACE_QA, (workspace_id, limit))
+        else:
+            cursor.execute(SQL.LIST_QA, (limit,))
+        return cursor.fetchall()
+
+def iter_qa_history(workspace_id: int = None, limit: int = 50):
     if workspace_id:
-        cursor.execute("SELECT * FROM qa_history WHERE workspace_id = %s ORDER BY created_at DESC LIMIT %s", (workspace_id, limit))
-    else:
-        cursor.execute("SELECT * FROM qa_history ORDER BY created_at DESC LIMIT %s", (limit,))
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return results
+        return stream_rows(SQL.LIST_WORKSPACE_QA, (workspace_id, limit))
+    return stream_rows(SQL.LIST_QA, (limit,))
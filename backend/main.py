@@ -1,62 +1,140 @@
 """FastAPI backend - Full Featured Document Analysis API"""
-import json
+import orjson
 import io
+import csv
+import itertools
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Query
+import hashlib
+import logging
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Query, Response, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, ORJSONResponse
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.decorator import cache
 from pydantic import BaseModel
 from typing import Optional, List
+from datetime import datetime
+from contextlib import asynccontextmanager
+from urllib.parse import quote
+from cachetools import TTLCache
 
-app = FastAPI(title="Document Analysis API", version="2.0.0")
+# Request-path messages are DEBUG so production (LOG_LEVEL=INFO) skips formatting and writing them
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+log = logging.getLogger("api")
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Threads for blocking database calls; more than the pool size so checkouts, not threads, are the limit
+DB_EXECUTOR_WORKERS = 32
 
-# Global flag for database status
-db_initialized = False
-db_error = None
+# Shared Redis client when REDIS_URL is set (list-response cache + model-response cache)
+redis_client = None
 
-@app.on_event("startup")
-async def startup():
-    global db_initialized, db_error
+def env_snapshot() -> dict:
+    """Connection settings reported by /health; read once at startup"""
+    db_user = os.getenv("DB_USER")
+    return {
+        "DB_HOST": os.getenv("DB_HOST", "not set"),
+        "DB_PORT": os.getenv("DB_PORT", "not set"),
+        "DB_NAME": os.getenv("DB_NAME", "not set"),
+        "DB_USER": db_user[:5] + "..." if db_user else "not set",
+        "PRODUCTION": os.getenv("PRODUCTION", "not set"),
+    }
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global redis_client
+    # Blocking database calls run here (see _db) - enough workers to keep the pool busy
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS))
+    # Response cache for the read-only list endpoints - Redis when configured, else per-process
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        from redis import asyncio as aioredis
+        from fastapi_cache.backends.redis import RedisBackend
+        redis_client = aioredis.from_url(redis_url)
+        FastAPICache.init(RedisBackend(redis_client), prefix="adoc")
+    else:
+        FastAPICache.init(InMemoryBackend(), prefix="adoc")
+    db_error = None
     try:
-        import database
         database.init_database()
-        db_initialized = True
-        print("Database initialized successfully!")
+        log.info("Database initialized successfully!")
     except Exception as e:
         db_error = str(e)
-        print(f"Database initialization failed: {e}")
+        log.error("Database initialization failed: %s", e)
+    # Everything /health reports except the cache counters is fixed for the life of the process
+    app.state.health = {
+        "status": "error" if db_error else "ok",
+        "db_initialized": db_error is None,
+        "db_error": db_error,
+        "env_vars": env_snapshot(),
+    }
+    
+    yield
+    
+    # Pooled connections stay open between requests; release them only when the process exits
+    try:
+        database.close_pool()
+    except Exception as e:
+        log.warning("Database pool shutdown failed: %s", e)
+    await openrouter_service.close_client()
+
+app = FastAPI(title="Document Analysis API", version="2.0.0", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 @app.get("/health")
 async def health_check():
-    return {
-        "status": "ok" if db_initialized else "error",
-        "db_initialized": db_initialized,
-        "db_error": db_error,
-        "env_vars": {
-            "DB_HOST": os.getenv("DB_HOST", "not set"),
-            "DB_PORT": os.getenv("DB_PORT", "not set"),
-            "DB_NAME": os.getenv("DB_NAME", "not set"),
-            "DB_USER": os.getenv("DB_USER", "not set")[:5] + "..." if os.getenv("DB_USER") else "not set",
-            "PRODUCTION": os.getenv("PRODUCTION", "not set"),
-        }
-    }
+    return {**app.state.health, "llm_cache": {"enabled": LLM_CACHE_ENABLED, **llm_cache_stats}}
+
+async def database_unavailable(request, exc):
+    return JSONResponse(status_code=503, content={"detail": "Database temporarily unavailable"}, headers={"Retry-After": "1"})
 
 # Import database module
 try:
     import database
     import openrouter_service
 except Exception as e:
-    print(f"Import error: {e}")
+    log.error("Import error: %s", e)
+else:
+    # Registered only once the import worked, so a failed import can't take the app down here
+    app.add_exception_handler(database.DatabaseUnavailable, database_unavailable)
+
+# Reads that clients poll. The ETag is a hash of the response body, so every worker and every
+# cold start agrees on it; it replaces fastapi-cache's, which hashes with Python's per-process hash().
+# (Workspace payloads embed document counts/lists, so workspaces.updated_at alone can't validate them.)
+ETAG_PATH_PREFIXES = ("/documents/", "/workspaces", "/analysis/")
+ETAG_CACHE_CONTROL = "private, max-age=5"
+
+@app.middleware("http")
+async def conditional_get(request, call_next):
+    """Tag JSON GET responses with a content ETag and answer a matching If-None-Match with 304"""
+    response = await call_next(request)
+    if (request.method != "GET" or response.status_code != 200
+            or not request.url.path.startswith(ETAG_PATH_PREFIXES)
+            or response.headers.get("content-type") != "application/json"):
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL})
+    # Keys from response.headers are lower-case; overwrite those so no second ETag goes out
+    headers = dict(response.headers)
+    headers["etag"] = etag
+    headers["cache-control"] = ETAG_CACHE_CONTROL
+    return Response(body, status_code=200, headers=headers)
+
+# Added after conditional_get so CORS wraps it and its 304s carry the CORS headers too
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 # ============ MODELS ============
+# Request bodies are validated by pydantic v2 (pinned in requirements.txt), whose
+# compiled pydantic-core validators are built once per model at import time
 
 class WorkspaceCreate(BaseModel):
     name: str
@@ -76,9 +154,14 @@ class CompareRequest(BaseModel):
     document_ids: List[int]
     workspace_id: Optional[int] = None
 
+class Criterion(BaseModel):
+    name: str
+    weight: float
+    description: Optional[str] = None
+
 class DecisionMatrixRequest(BaseModel):
     document_ids: List[int]
-    criteria: List[dict]
+    criteria: List[Criterion]
     name: str
     workspace_id: Optional[int] = None
 
@@ -89,20 +172,170 @@ class QARequest(BaseModel):
 
 # ============ HELPER FUNCTIONS ============
 
+async def _db(fn, *args, **kwargs):
+    """Run a blocking database helper on the default executor instead of the event loop"""
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
 def serialize_datetime(obj):
     """Convert datetime objects to ISO format strings"""
     if hasattr(obj, 'isoformat'):
         return obj.isoformat()
     return obj
 
+async def invalidate_cache(*namespaces):
+    """Drop cached list responses after a write"""
+    for namespace in namespaces:
+        await FastAPICache.clear(namespace=namespace)
+
 def serialize_result(result):
     """Serialize database result with datetime handling"""
     if isinstance(result, list):
-        return [{k: serialize_datetime(v) for k, v in r.items()} for r in result]
+        if not result:
+            return []
+        # Rows share a schema: find the datetime columns once instead of probing every value.
+        # Columns that are NULL in the first row can't be typed from it, so those get checked per value.
+        first = result[0]
+        datetime_keys = frozenset(k for k, v in first.items() if isinstance(v, datetime))
+        unknown_keys = frozenset(k for k, v in first.items() if v is None)
+        if not unknown_keys:
+            return [{k: (v.isoformat() if k in datetime_keys and v is not None else v) for k, v in r.items()} for r in result]
+        return [{
+            k: (v.isoformat() if v is not None and (k in datetime_keys or (k in unknown_keys and isinstance(v, datetime))) else v)
+            for k, v in r.items()
+        } for r in result]
     elif isinstance(result, dict):
         return {k: serialize_datetime(v) for k, v in result.items()}
     return result
 
+def stored_json(value):
+    """Embed a JSON column in the response as-is instead of parsing and re-encoding it.
+    The connector never decodes JSON columns, so a value is always str/bytes or NULL."""
+    return None if value is None else orjson.Fragment(value)
+
+def ndjson_response(rows, transform):
+    """Stream rows as newline-delimited JSON; the sync generator runs in the threadpool"""
+    return StreamingResponse(
+        (orjson.dumps(transform(row)) + b"\n" for row in rows),
+        media_type="application/x-ndjson"
+    )
+
+# Uploads are read from Starlette's spooled temp file in small chunks and rejected
+# as soon as they cross the limit, instead of one unbounded file.read()
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_SIZE = 15 * 1024 * 1024
+# Accepted upload extensions; the error message lists them in this order
+ALLOWED_TYPES_ORDER = ("pdf", "docx", "doc", "png", "jpg", "jpeg", "gif", "webp", "txt", "md", "csv")
+ALLOWED_TYPES = frozenset(ALLOWED_TYPES_ORDER)
+ALLOWED_TYPES_TEXT = ", ".join(ALLOWED_TYPES_ORDER)
+# Parallel uploads handled by /upload-multiple (each may hold a file in memory and an LLM call)
+UPLOAD_CONCURRENCY = 5
+# Files accepted per /upload-multiple request - every accepted file is held in memory until it is saved
+MAX_FILES_PER_UPLOAD = 20
+
+async def read_upload(file: UploadFile):
+    """Return (bytearray, sha256 hex) for an upload, failing fast on oversize files"""
+    too_large = HTTPException(status_code=400, detail="File too large. Maximum size is 15MB.")
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        raise too_large
+    hasher = hashlib.sha256()
+    buffer = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        if len(buffer) + len(chunk) > MAX_UPLOAD_SIZE:
+            raise too_large
+        hasher.update(chunk)
+        buffer += chunk
+    # Hand back the buffer itself: every consumer takes bytes-like input, so no second copy
+    return buffer, hasher.hexdigest()
+
+def content_disposition(filename: str) -> str:
+    """RFC 6266 attachment header: an ASCII fallback plus the exact UTF-8 name in filename*"""
+    fallback = filename.encode("ascii", "replace").decode().replace("\\", "_").replace('"', "_")
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+async def load_documents(doc_ids: list) -> list:
+    """Fetch all requested documents in one query, off the event loop; 404 on the first missing id"""
+    found = await asyncio.to_thread(database.get_documents_full, doc_ids)
+    for doc_id in doc_ids:
+        if doc_id not in found:
+            raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
+    return [{
+        "id": doc_id,
+        "name": found[doc_id]["filename"],
+        "type": found[doc_id]["file_type"],
+        "data": found[doc_id]["file_data"]
+    } for doc_id in doc_ids]
+
+# ============ MODEL RESPONSE CACHE ============
+# Identical (file contents, analysis, question, chart type, models) requests reuse the
+# previous model answer instead of another multi-second OpenRouter round trip.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+llm_cache_stats = {"hits": 0, "misses": 0}
+# Holds encoded JSON like Redis does, so every hit gets its own dict and no caller can
+# mutate the copy the next request is served from
+_llm_local_cache = TTLCache(maxsize=512, ttl=LLM_CACHE_TTL)
+
+def llm_cache_key(file_sha256: str, analysis_type: str, question: str = None, chart_type: str = None) -> str:
+    raw = f"{file_sha256}:{analysis_type}:{question}:{chart_type}:{openrouter_service.MODEL_SIGNATURE}"
+    return "adoc:llm:" + hashlib.blake2b(raw.encode(), digest_size=20).hexdigest()
+
+async def _llm_cache_get(key: str):
+    if redis_client is not None:
+        cached = await redis_client.get(key)
+    else:
+        cached = _llm_local_cache.get(key)
+    return orjson.loads(cached) if cached else None
+
+async def _llm_cache_set(key: str, result: dict):
+    if redis_client is not None:
+        await redis_client.setex(key, LLM_CACHE_TTL, orjson.dumps(result))
+    else:
+        _llm_local_cache[key] = orjson.dumps(result)
+
+async def cached_analysis(doc: dict, analysis_type: str, question: str = None, chart_type: str = None, file_data: bytes = None) -> dict:
+    """openrouter_service.analyze_document for a document row, served from cache on a repeat.
+    The blob is only read from the database on a miss, unless the caller already has it."""
+    sha256 = doc.get("file_sha256")
+    if sha256 is None:
+        # Saved before hashes were recorded - hash once and remember it
+        file_data = await _db(database.get_document_bytes, doc["id"])
+        sha256 = hashlib.sha256(file_data).hexdigest()
+        await _db(database.update_document_sha256, doc["id"], sha256)
+    
+    key = llm_cache_key(sha256, analysis_type, question, chart_type)
+    if LLM_CACHE_ENABLED:
+        try:
+            cached = await _llm_cache_get(key)
+        except Exception as e:
+            log.warning("LLM cache read failed: %s", e)
+            cached = None
+        if cached is not None:
+            llm_cache_stats["hits"] += 1
+            return cached
+        llm_cache_stats["misses"] += 1
+    
+    if file_data is None:
+        file_data = await _db(database.get_document_bytes, doc["id"])
+    result = await openrouter_service.analyze_document(
+        file_data=file_data,
+        filename=doc["filename"],
+        file_type=doc["file_type"],
+        analysis_type=analysis_type,
+        question=question,
+        chart_type=chart_type
+    )
+    if LLM_CACHE_ENABLED:
+        try:
+            await _llm_cache_set(key, result)
+        except Exception as e:
+            log.warning("LLM cache write failed: %s", e)
+    return result
+
+# Page-size bounds for the keyset-paginated list endpoints (?limit=&before=<created_at>&before_id=<id>)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+PageLimit = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+
 # ============ ROOT ============
 
 @app.get("/")
@@ -115,38 +348,52 @@ async def root():
 
 @app.post("/workspaces")
 async def create_workspace(workspace: WorkspaceCreate):
-    workspace_id = database.create_workspace(workspace.name, workspace.description)
+    workspace_id = await _db(database.create_workspace, workspace.name, workspace.description)
+    await invalidate_cache("workspaces")
     return {"id": workspace_id, "name": workspace.name, "description": workspace.description}
 
 @app.get("/workspaces")
-async def list_workspaces():
-    workspaces = database.get_workspaces()
-    return serialize_result(workspaces)
+@cache(expire=60, namespace="workspaces")
+async def list_workspaces(include_documents: bool = Query(default=False)):
+    if not include_documents:
+        return serialize_result(await _db(database.get_workspaces))
+    workspaces = await _db(database.get_workspaces_with_documents)
+    result = []
+    for workspace in workspaces:
+        docs = workspace.pop("documents")
+        item = serialize_result(workspace)
+        item["documents"] = serialize_result(docs)
+        result.append(item)
+    return result
 
 @app.get("/workspaces/{workspace_id}")
 async def get_workspace(workspace_id: int):
-    workspace = database.get_workspace(workspace_id)
+    workspace = await _db(database.get_workspace, workspace_id)
     if not workspace:
         raise HTTPException(status_code=404, detail="Workspace not found")
-    docs = database.get_documents_by_workspace(workspace_id)
+    docs = await _db(database.get_documents_by_workspace, workspace_id)
     result = serialize_result(workspace)
     result["documents"] = serialize_result(docs)
     return result
 
 @app.put("/workspaces/{workspace_id}")
 async def update_workspace(workspace_id: int, workspace: WorkspaceUpdate):
-    database.update_workspace(workspace_id, workspace.name, workspace.description)
+    if not await _db(database.update_workspace, workspace_id, workspace.name, workspace.description):
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    await invalidate_cache("workspaces")
     return {"message": "Workspace updated"}
 
 @app.delete("/workspaces/{workspace_id}")
 async def delete_workspace(workspace_id: int):
-    database.delete_workspace(workspace_id)
+    await _db(database.delete_workspace, workspace_id)
+    await invalidate_cache("workspaces", "documents")
     return {"message": "Workspace deleted"}
 
 @app.post("/workspaces/{workspace_id}/assign-all")
 async def assign_all_docs_to_workspace(workspace_id: int):
     """Assign all documents to a specific workspace"""
-    count = database.assign_all_documents_to_workspace(workspace_id)
+    count = await _db(database.assign_all_documents_to_workspace, workspace_id)
+    await invalidate_cache("workspaces", "documents")
     return {"message": f"Assigned {count} documents to workspace {workspace_id}"}
 
 # ============ DOCUMENTS ============
@@ -157,77 +404,159 @@ async def upload_document(
     workspace_id: Optional[int] = Form(default=None),
     auto_analyze: bool = Form(default=True)
 ):
-    print(f"Upload received - workspace_id: {workspace_id}, auto_analyze: {auto_analyze}")
-    
-    allowed_types = ["pdf", "docx", "doc", "png", "jpg", "jpeg", "gif", "webp", "txt", "md", "csv"]
+    upload_result, _ = await store_upload(file, workspace_id, auto_analyze)
+    return upload_result
+
+def upload_extension(file: UploadFile):
+    """(filename, lowercase extension) for an upload, rejecting unsupported types"""
     filename = file.filename or "unknown"
-    file_ext = filename.split(".")[-1].lower() if "." in filename else ""
-    
-    if file_ext not in allowed_types:
-        raise HTTPException(status_code=400, detail=f"File type not supported. Allowed: {', '.join(allowed_types)}")
+    _, dot, file_ext = filename.rpartition(".")
+    file_ext = file_ext.lower() if dot else ""
     
-    file_data = await file.read()
+    if file_ext not in ALLOWED_TYPES:
+        raise HTTPException(status_code=400, detail=f"File type not supported. Allowed: {ALLOWED_TYPES_TEXT}")
+    return filename, file_ext
+
+async def auto_suggest(doc_id: int, filename: str, file_ext: str, file_data: bytes, sha256: str):
+    """Generate and save analysis suggestions for a new document; None if that fails"""
+    try:
+        # Same bytes seen before (re-upload, shared file) - reuse their suggestions
+        suggestions_json = await _db(database.get_cached_suggestions, sha256, openrouter_service.MODEL_SIGNATURE)
+        if suggestions_json is not None:
+            log.debug("Reusing cached suggestions for document %s: %s", doc_id, filename)
+            suggestions = orjson.loads(suggestions_json)
+        else:
+            log.debug("Auto-analyzing document %s: %s", doc_id, filename)
+            suggestions = await openrouter_service.get_analysis_suggestions(file_data, filename, file_ext)
+            suggestions_json = orjson.dumps(suggestions).decode()
+            await _db(database.save_cached_suggestions, sha256, openrouter_service.MODEL_SIGNATURE, suggestions_json)
+        await _db(database.update_document_suggestions, doc_id, suggestions_json)
+        log.debug("Suggestions saved for document %s", doc_id)
+        return suggestions
+    except Exception as e:
+        # Don't fail upload if analysis fails
+        log.warning("Auto-analysis failed for %s: %s", doc_id, e)
+        return None
+
+async def store_upload(file: UploadFile, workspace_id: Optional[int], auto_analyze: bool):
+    """Validate and save an upload; returns (upload response, file bytes) so callers can keep working on the bytes"""
+    log.debug("Upload received - workspace_id: %s, auto_analyze: %s", workspace_id, auto_analyze)
+    filename, file_ext = upload_extension(file)
+    file_data, sha256 = await read_upload(file)
     file_size = len(file_data)
     
-    if file_size > 15 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large. Maximum size is 15MB.")
-    
-    doc_id = database.save_document(filename, file_ext, file_size, file_data, workspace_id)
-    print(f"Document saved with id: {doc_id}, workspace_id: {workspace_id}")
+    doc_id = await _db(database.save_document, filename, file_ext, file_size, file_data, workspace_id, sha256=sha256)
+    await invalidate_cache("workspaces", "documents")
+    log.debug("Document saved with id: %s, workspace_id: %s", doc_id, workspace_id)
     
     # Auto-analyze document to get suggestions (saves API credits by doing once)
     suggestions = None
     if auto_analyze:
-        try:
-            print(f"Auto-analyzing document {doc_id}: {filename}")
-            suggestions = await openrouter_service.get_analysis_suggestions(file_data, filename, file_ext)
-            database.update_document_suggestions(doc_id, json.dumps(suggestions))
-            print(f"Suggestions saved for document {doc_id}")
-        except Exception as e:
-            print(f"Auto-analysis failed for {doc_id}: {e}")
-            # Don't fail upload if analysis fails
+        suggestions = await auto_suggest(doc_id, filename, file_ext, file_data, sha256)
+        await invalidate_cache("documents")
     
     return {
         "id": doc_id, 
         "filename": filename, 
         "file_type": file_ext, 
         "file_size": file_size, 
+        "file_sha256": sha256,
         "workspace_id": workspace_id,
         "suggestions": suggestions
-    }
+    }, file_data
 
 @app.post("/upload-multiple")
 async def upload_multiple_documents(
     files: List[UploadFile] = File(...),
     workspace_id: Optional[int] = Form(default=None)
 ):
+    if len(files) > MAX_FILES_PER_UPLOAD:
+        raise HTTPException(status_code=400, detail=f"Too many files. Maximum is {MAX_FILES_PER_UPLOAD} per upload.")
+    
+    async def read_one(file):
+        filename, file_ext = upload_extension(file)
+        file_data, sha256 = await read_upload(file)
+        # A list, so the bytes can be dropped once suggestions no longer need them
+        return [filename, file_ext, file_data, sha256, len(file_data)]
+    
+    reads = await asyncio.gather(*(read_one(f) for f in files), return_exceptions=True)
+    accepted = [read for read in reads if not isinstance(read, Exception)]
+    
+    # Every accepted file is saved in one transaction instead of a commit per file
+    doc_ids = []
+    if accepted:
+        doc_ids = await _db(database.save_documents_bulk, [
+            (filename, file_ext, file_size, file_data, workspace_id, sha256)
+            for filename, file_ext, file_data, sha256, file_size in accepted
+        ])
+        await invalidate_cache("workspaces", "documents")
+    
+    # Suggestions are generated concurrently, at most UPLOAD_CONCURRENCY model calls at a time
+    semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+    
+    async def suggest_one(doc_id, read):
+        async with semaphore:
+            filename, file_ext, file_data, sha256, _ = read
+            # The suggestion call holds the last reference - each file is freed as soon as it is done
+            read[2] = None
+            return await auto_suggest(doc_id, filename, file_ext, file_data, sha256)
+    
+    suggestions = await asyncio.gather(*(suggest_one(doc_id, read) for doc_id, read in zip(doc_ids, accepted)))
+    if accepted:
+        await invalidate_cache("documents")
+    
+    saved = iter(zip(doc_ids, accepted, suggestions))
     results = []
-    for file in files:
-        try:
-            result = await upload_document(file, workspace_id)
-            results.append(result)
-        except HTTPException as e:
-            results.append({"filename": file.filename, "error": e.detail})
+    for file, read in zip(files, reads):
+        if isinstance(read, HTTPException):
+            results.append({"filename": file.filename, "error": read.detail})
+        elif isinstance(read, Exception):
+            results.append({"filename": file.filename, "error": str(read)})
+        else:
+            doc_id, (filename, file_ext, _, sha256, file_size), doc_suggestions = next(saved)
+            results.append({
+                "id": doc_id,
+                "filename": filename,
+                "file_type": file_ext,
+                "file_size": file_size,
+                "file_sha256": sha256,
+                "workspace_id": workspace_id,
+                "suggestions": doc_suggestions
+            })
     return {"uploaded": results}
 
 @app.get("/documents")
-async def list_documents(workspace_id: Optional[int] = Query(default=None)):
+@cache(expire=60, namespace="documents")
+async def list_documents(
+    workspace_id: Optional[int] = Query(default=None),
+    limit: int = PageLimit,
+    before: Optional[datetime] = Query(default=None),
+    before_id: Optional[int] = Query(default=None),
+    lean: bool = Query(default=False)
+):
     if workspace_id:
-        docs = database.get_documents_by_workspace(workspace_id)
+        docs = await _db(database.get_documents_by_workspace, workspace_id, limit, before, before_id)
     else:
-        docs = database.get_all_documents()
-    # Parse suggestions JSON
+        docs = await _db(database.get_all_documents, limit, before, before_id)
+    # serialize_result copies each (possibly cached) row, so parse on the copies
+    docs = serialize_result(docs)
+    # ?lean=true skips the parse and sends suggestions as the stored JSON string
     for doc in docs:
-        if doc.get("suggestions") and isinstance(doc["suggestions"], str):
-            try:
-                doc["suggestions"] = json.loads(doc["suggestions"])
-            except:
-                doc["suggestions"] = None
-    return serialize_result(docs)
+        value = doc.get("suggestions")
+        if not isinstance(value, (str, bytes, bytearray)):
+            continue
+        if lean:
+            doc["suggestions"] = value if isinstance(value, str) else bytes(value).decode()
+            continue
+        try:
+            doc["suggestions"] = orjson.loads(value)
+        except orjson.JSONDecodeError:
+            doc["suggestions"] = None
+    return docs
 
 @app.get("/documents/{doc_id}")
 async def get_document(doc_id: int):
-    doc = database.get_document(doc_id)
+    doc = await _db(database.get_document, doc_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     return {
@@ -235,71 +564,113 @@ async def get_document(doc_id: int):
         "filename": doc["filename"],
         "file_type": doc["file_type"],
         "file_size": doc["file_size"],
-        "page_count": doc["page_count"],
+        "file_sha256": doc.get("file_sha256"),
+        "page_count": doc.get("page_count"),
         "workspace_id": doc["workspace_id"],
         "created_at": serialize_datetime(doc["created_at"])
     }
 
+@app.get("/documents/{doc_id}/file")
+async def download_document(doc_id: int, if_none_match: Optional[str] = Header(default=None)):
+    """Stream the original file without loading the whole blob"""
+    doc = await _db(database.get_document, doc_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    headers = {"Content-Disposition": content_disposition(doc["filename"])}
+    # The content hash recorded at upload is a strong ETag - a revalidation never touches the blob
+    if doc.get("file_sha256"):
+        headers["ETag"] = f'"{doc["file_sha256"]}"'
+        if if_none_match == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+    # Check the blob before committing to a 200 - afterwards a missing file could only truncate the body
+    blob = await _db(database.get_blob_info, doc_id)
+    if not blob:
+        raise HTTPException(status_code=404, detail="File not found")
+    headers["Content-Length"] = str(doc["file_size"])
+    return StreamingResponse(
+        database.get_document_stream(doc_id, *blob),
+        media_type=openrouter_service.get_mime_type(doc["file_type"]),
+        headers=headers
+    )
+
 @app.delete("/documents/{doc_id}")
 async def delete_document(doc_id: int):
-    database.delete_document(doc_id)
+    await _db(database.delete_document, doc_id)
+    await invalidate_cache("workspaces", "documents")
     return {"message": "Document deleted"}
 
 @app.put("/documents/{doc_id}/workspace")
 async def move_document_to_workspace(doc_id: int, workspace_id: int = Query(...)):
-    database.update_document_workspace(doc_id, workspace_id)
+    if not await _db(database.update_document_workspace, doc_id, workspace_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    await invalidate_cache("workspaces", "documents")
     return {"message": "Document moved to workspace"}
 
 # ============ ANALYSIS ============
 
 @app.post("/analyze")
 async def analyze_document(request: AnalysisRequest):
-    doc = database.get_document(request.document_id)
+    doc = await _db(database.get_document, request.document_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
-    
+    return await analyze_loaded(doc, request)
+
+async def analyze_loaded(doc: dict, request: AnalysisRequest, file_data: bytes = None):
+    """Run and save an analysis for a document row the caller has already loaded"""
     try:
-        print(f"Analyzing document {request.document_id} with type {request.analysis_type}")
-        result = await openrouter_service.analyze_document(
-            file_data=doc["file_data"],
-            filename=doc["filename"],
-            file_type=doc["file_type"],
+        log.debug("Analyzing document %s with type %s", request.document_id, request.analysis_type)
+        result = await cached_analysis(
+            doc,
             analysis_type=request.analysis_type,
             question=request.question,
-            chart_type=request.chart_type
+            chart_type=request.chart_type,
+            file_data=file_data
         )
         
-        analysis_id = database.save_analysis(
+        analysis_id = await _db(database.save_analysis,
             document_id=request.document_id,
             analysis_type=request.analysis_type,
-            result_json=json.dumps(result)
+            result_json=orjson.dumps(result).decode()
         )
         
         return {"analysis_id": analysis_id, "result": result}
     except Exception as e:
-        import traceback
-        print(f"Analysis error: {str(e)}")
-        traceback.print_exc()
+        log.exception("Analysis error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/analyze-upload")
 async def upload_and_analyze(
     file: UploadFile = File(...),
     analysis_type: str = Form(default="summarize"),
-    workspace_id: Optional[int] = Form(default=None)
+    workspace_id: Optional[int] = Form(default=None),
+    with_suggestions: bool = Form(default=False)
 ):
-    upload_result = await upload_document(file, workspace_id)
+    # The requested analysis replaces the suggestions pass, and runs on the bytes already in memory
+    upload_result, file_data = await store_upload(file, workspace_id, auto_analyze=False)
     request = AnalysisRequest(document_id=upload_result["id"], analysis_type=analysis_type)
-    analysis_result = await analyze_document(request)
+    if not with_suggestions:
+        analysis_result = await analyze_loaded(upload_result, request, file_data)
+        return {"document": upload_result, "analysis": analysis_result}
+    
+    # Both LLM round-trips overlap instead of running back to back
+    upload_result["suggestions"], analysis_result = await asyncio.gather(
+        auto_suggest(upload_result["id"], upload_result["filename"], upload_result["file_type"], file_data, upload_result["file_sha256"]),
+        analyze_loaded(upload_result, request, file_data)
+    )
+    await invalidate_cache("documents")
     return {"document": upload_result, "analysis": analysis_result}
 
+def _analysis_row(r):
+    r["result_json"] = stored_json(r["result_json"])
+    r["created_at"] = serialize_datetime(r["created_at"])
+    return r
+
 @app.get("/analysis/{doc_id}")
-async def get_analysis_history(doc_id: int):
-    results = database.get_analysis_by_document(doc_id)
-    for r in results:
-        r["result_json"] = json.loads(r["result_json"])
-        r["created_at"] = serialize_datetime(r["created_at"])
-    return results
+async def get_analysis_history(doc_id: int, stream: bool = Query(default=False), limit: int = PageLimit, before: Optional[datetime] = Query(default=None), before_id: Optional[int] = Query(default=None)):
+    if stream:
+        return ndjson_response(database.iter_analysis_by_document(doc_id), _analysis_row)
+    # Returned as a response so the JSON fragments skip jsonable_encoder and go straight to orjson
+    return ORJSONResponse([_analysis_row(r) for r in await _db(database.get_analysis_by_document, doc_id, limit, before, before_id)])
 
 # ============ COMPARISON ============
 
@@ -308,20 +679,10 @@ async def compare_documents(request: CompareRequest):
     if len(request.document_ids) < 2:
         raise HTTPException(status_code=400, detail="At least 2 documents required for comparison")
     
-    documents = []
-    for doc_id in request.document_ids:
-        doc = database.get_document(doc_id)
-        if not doc:
-            raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
-        documents.append({
-            "id": doc_id,
-            "name": doc["filename"],
-            "type": doc["file_type"],
-            "data": doc["file_data"]
-        })
+    documents = await load_documents(request.document_ids)
     
     try:
-        print(f"Comparing {len(documents)} documents")
+        log.debug("Comparing %d documents", len(documents))
         if len(documents) == 2:
             result = await openrouter_service.compare_two_documents(
                 documents[0]["data"], documents[0]["name"], documents[0]["type"],
@@ -330,27 +691,31 @@ async def compare_documents(request: CompareRequest):
         else:
             result = await openrouter_service.compare_multiple_documents(documents)
         
-        comparison_id = database.save_comparison(
+        comparison_id = await _db(database.save_comparison,
             document_ids=request.document_ids,
-            result_json=json.dumps(result),
+            result_json=orjson.dumps(result).decode(),
             workspace_id=request.workspace_id
         )
         
         return {"comparison_id": comparison_id, "result": result}
     except Exception as e:
-        import traceback
-        print(f"Compare error: {str(e)}")
-        traceback.print_exc()
+        log.exception("Compare error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+def _comparison_row(c):
+    c["document_ids"] = stored_json(c["document_ids"])
+    c["result_json"] = stored_json(c["result_json"])
+    c["created_at"] = serialize_datetime(c["created_at"])
+    return c
+
 @app.get("/comparisons")
-async def list_comparisons(workspace_id: Optional[int] = Query(default=None)):
-    comparisons = database.get_comparisons(workspace_id)
-    for c in comparisons:
-        c["document_ids"] = json.loads(c["document_ids"]) if isinstance(c["document_ids"], str) else c["document_ids"]
-        c["result_json"] = json.loads(c["result_json"])
-        c["created_at"] = serialize_datetime(c["created_at"])
-    return comparisons
+async def list_comparisons(workspace_id: Optional[int] = Query(default=None), limit: int = PageLimit, before: Optional[datetime] = Query(default=None), before_id: Optional[int] = Query(default=None)):
+    return ORJSONResponse([_comparison_row(c) for c in await _db(database.get_comparisons, workspace_id, limit, before, before_id)])
+
+@app.get("/documents/{doc_id}/comparisons")
+async def list_document_comparisons(doc_id: int, limit: int = PageLimit):
+    # Served from the comparison_documents junction table, not a scan of the JSON document_ids
+    return ORJSONResponse([_comparison_row(c) for c in await _db(database.get_comparisons_for_document, doc_id, limit)])
 
 # ============ DECISION MATRIX ============
 
@@ -360,45 +725,39 @@ async def create_decision_matrix(request: DecisionMatrixRequest):
         raise HTTPException(status_code=400, detail="At least 2 documents required")
     
     # Validate criteria weights sum to 1.0
-    total_weight = sum(c.get("weight", 0) for c in request.criteria)
+    total_weight = sum(c.weight for c in request.criteria)
     if abs(total_weight - 1.0) > 0.01:
         raise HTTPException(status_code=400, detail=f"Criteria weights must sum to 1.0 (current: {total_weight})")
     
-    documents = []
-    for doc_id in request.document_ids:
-        doc = database.get_document(doc_id)
-        if not doc:
-            raise HTTPException(status_code=404, detail=f"Document {doc_id} not found")
-        documents.append({
-            "id": doc_id,
-            "name": doc["filename"],
-            "type": doc["file_type"],
-            "data": doc["file_data"]
-        })
+    criteria = [c.model_dump(exclude_none=True) for c in request.criteria]
+    documents = await load_documents(request.document_ids)
     
     try:
-        result = await openrouter_service.build_decision_matrix(documents, request.criteria)
+        result = await openrouter_service.build_decision_matrix(documents, criteria)
         
-        matrix_id = database.save_decision_matrix(
+        matrix_id = await _db(database.save_decision_matrix,
             name=request.name,
-            criteria=request.criteria,
+            criteria=criteria,
             options=[{"id": d["id"], "name": d["name"]} for d in documents],
-            result_json=json.dumps(result),
+            result_json=orjson.dumps(result).decode(),
             workspace_id=request.workspace_id
         )
+        await invalidate_cache("decision-matrices")
         
         return {"matrix_id": matrix_id, "result": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/decision-matrices")
-async def list_decision_matrices(workspace_id: Optional[int] = Query(default=None)):
-    matrices = database.get_decision_matrices(workspace_id)
+@cache(expire=300, namespace="decision-matrices")
+async def list_decision_matrices(workspace_id: Optional[int] = Query(default=None), limit: int = PageLimit, before: Optional[datetime] = Query(default=None), before_id: Optional[int] = Query(default=None)):
+    matrices = await _db(database.get_decision_matrices, workspace_id, limit, before, before_id)
     for m in matrices:
-        m["criteria"] = json.loads(m["criteria"]) if isinstance(m["criteria"], str) else m["criteria"]
-        m["options"] = json.loads(m["options"]) if isinstance(m["options"], str) else m["options"]
+        # NOT NULL JSON columns come back as str or bytes, both of which orjson.loads takes directly
+        m["criteria"] = orjson.loads(m["criteria"])
+        m["options"] = orjson.loads(m["options"])
         if m["result_json"]:
-            m["result_json"] = json.loads(m["result_json"])
+            m["result_json"] = orjson.loads(m["result_json"])
         m["created_at"] = serialize_datetime(m["created_at"])
     return matrices
 
@@ -410,22 +769,16 @@ async def ask_question(request: QARequest):
         raise HTTPException(status_code=400, detail="At least one document required")
     
     # For now, use the first document (can be extended to multi-doc Q&A)
-    doc = database.get_document(request.document_ids[0])
+    doc = await _db(database.get_document, request.document_ids[0])
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     
     try:
-        result = await openrouter_service.analyze_document(
-            file_data=doc["file_data"],
-            filename=doc["filename"],
-            file_type=doc["file_type"],
-            analysis_type="qa",
-            question=request.question
-        )
+        result = await cached_analysis(doc, analysis_type="qa", question=request.question)
         
-        qa_id = database.save_qa(
+        qa_id = await _db(database.save_qa,
             question=request.question,
-            answer_json=json.dumps(result),
+            answer_json=orjson.dumps(result).decode(),
             document_ids=request.document_ids,
             workspace_id=request.workspace_id
         )
@@ -434,33 +787,35 @@ async def ask_question(request: QARequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _qa_row(h):
+    h["document_ids"] = stored_json(h["document_ids"]) if h["document_ids"] else []
+    h["answer_json"] = stored_json(h["answer_json"])
+    h["created_at"] = serialize_datetime(h["created_at"])
+    return h
+
 @app.get("/qa-history")
-async def get_qa_history(workspace_id: Optional[int] = Query(default=None), limit: int = Query(default=50)):
-    history = database.get_qa_history(workspace_id, limit)
-    for h in history:
-        h["document_ids"] = json.loads(h["document_ids"]) if h["document_ids"] else []
-        h["answer_json"] = json.loads(h["answer_json"])
-        h["created_at"] = serialize_datetime(h["created_at"])
-    return history
+async def get_qa_history(workspace_id: Optional[int] = Query(default=None), limit: int = Query(default=50), stream: bool = Query(default=False)):
+    if stream:
+        return ndjson_response(database.iter_qa_history(workspace_id, limit), _qa_row)
+    return ORJSONResponse([_qa_row(h) for h in await _db(database.get_qa_history, workspace_id, limit)])
+
+@app.get("/documents/{doc_id}/qa-history")
+async def get_document_qa_history(doc_id: int, limit: int = PageLimit):
+    # Served from the qa_documents junction table, not a scan of the JSON document_ids
+    return ORJSONResponse([_qa_row(h) for h in await _db(database.get_qa_for_document, doc_id, limit)])
 
 # ============ CHARTS ============
 
 @app.post("/charts")
 async def generate_chart(request: AnalysisRequest):
-    doc = database.get_document(request.document_id)
+    doc = await _db(database.get_document, request.document_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     
     try:
-        result = await openrouter_service.analyze_document(
-            file_data=doc["file_data"],
-            filename=doc["filename"],
-            file_type=doc["file_type"],
-            analysis_type="chart",
-            chart_type=request.chart_type or "bar"
-        )
+        result = await cached_analysis(doc, analysis_type="chart", chart_type=request.chart_type or "bar")
         
-        chart_id = database.save_chart(
+        chart_id = await _db(database.save_chart,
             document_id=request.document_id,
             chart_type=result.get("chart_type", "bar"),
             title=result.get("title", "Chart"),
@@ -472,12 +827,12 @@ async def generate_chart(request: AnalysisRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/charts/{doc_id}")
-async def get_document_charts(doc_id: int):
-    charts = database.get_charts_by_document(doc_id)
+async def get_document_charts(doc_id: int, limit: int = PageLimit, before: Optional[datetime] = Query(default=None), before_id: Optional[int] = Query(default=None)):
+    charts = await _db(database.get_charts_by_document, doc_id, limit, before, before_id)
     for c in charts:
-        c["chart_data"] = json.loads(c["chart_data"]) if isinstance(c["chart_data"], str) else c["chart_data"]
+        c["chart_data"] = stored_json(c["chart_data"])
         c["created_at"] = serialize_datetime(c["created_at"])
-    return charts
+    return ORJSONResponse(charts)
 
 # ============ REPORTS & SLIDES ============
 
@@ -493,56 +848,62 @@ async def generate_slides(request: AnalysisRequest):
 
 # ============ EXPORT ============
 
+def csv_export_rows(rows):
+    """Yield the CSV export one analysis block at a time; the sync generator runs in the threadpool"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for r in rows:
+        result_data = orjson.loads(r["result_json"])
+        writer.writerow(["Analysis Type", r["analysis_type"]])
+        writer.writerow(["Created At", str(r["created_at"])])
+        writer.writerow([])
+        
+        # Write key-value pairs
+        for key, value in result_data.items():
+            if isinstance(value, (str, int, float)):
+                writer.writerow([key, value])
+            elif isinstance(value, list):
+                writer.writerow([key, orjson.dumps(value).decode()])
+        writer.writerow([])
+        
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
 @app.get("/export/{doc_id}")
 async def export_analysis(doc_id: int, format: str = Query(default="json")):
     """Export analysis results as JSON or CSV"""
-    results = database.get_analysis_by_document(doc_id)
-    if not results:
+    # Exports cover the whole history, so read it through the unbuffered cursor rather than a page
+    rows = database.iter_analysis_by_document(doc_id)
+    first = await _db(next, rows, None)
+    if first is None:
         raise HTTPException(status_code=404, detail="No analysis found for this document")
+    rows = itertools.chain([first], rows)
     
     if format == "csv":
-        # Create CSV export
-        import csv
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        for r in results:
-            result_data = json.loads(r["result_json"])
-            writer.writerow(["Analysis Type", r["analysis_type"]])
-            writer.writerow(["Created At", str(r["created_at"])])
-            writer.writerow([])
-            
-            # Write key-value pairs
-            for key, value in result_data.items():
-                if isinstance(value, (str, int, float)):
-                    writer.writerow([key, value])
-                elif isinstance(value, list):
-                    writer.writerow([key, json.dumps(value)])
-            writer.writerow([])
-        
-        output.seek(0)
+        # Stream one analysis at a time straight off the cursor instead of building the file in memory
         return StreamingResponse(
-            iter([output.getvalue()]),
+            csv_export_rows(rows),
             media_type="text/csv",
             headers={"Content-Disposition": f"attachment; filename=analysis_{doc_id}.csv"}
         )
     else:
         # JSON export
         export_data = []
-        for r in results:
+        for r in await _db(list, rows):
             export_data.append({
                 "analysis_type": r["analysis_type"],
                 "created_at": serialize_datetime(r["created_at"]),
-                "result": json.loads(r["result_json"])
+                "result": stored_json(r["result_json"])
             })
-        return export_data
+        return ORJSONResponse(export_data)
 
 # ============ SMART SUGGESTIONS ============
 
 @app.get("/suggest/{doc_id}")
 async def get_suggestions(doc_id: int):
     """Get smart analysis suggestions for a document"""
-    doc = database.get_document(doc_id)
+    doc = await _db(database.get_document_full, doc_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     
@@ -554,8 +915,7 @@ async def get_suggestions(doc_id: int):
         )
         return result
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        log.exception("Suggestions error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
@@ -1,10 +1,24 @@
 """OpenRouter API service - Full Featured Document Analysis"""
 import os
+import asyncio
 import base64
+import random
 import httpx
-import json
+import orjson
 import io
+import hashlib
+import threading
+import zipfile
+from typing import Optional
 from dotenv import load_dotenv
+from cachetools import LRUCache
+from lxml import etree
+
+# SIMD base64 for the multi-megabyte PDFs/images sent inline; stdlib is the fallback
+try:
+    import pybase64
+except ImportError:
+    pybase64 = None
 
 load_dotenv()
 
@@ -13,150 +27,284 @@ API_KEY = os.getenv("OPENROUTER_API_KEY")
 
 PDF_MODEL = "anthropic/claude-sonnet-4"
 TEXT_MODEL = "openai/gpt-4o"
+# Identifies the models behind a response - part of every cache key for model output
+MODEL_SIGNATURE = f"{PDF_MODEL},{TEXT_MODEL}"
+
+# File types sent as extracted text / as image_url parts
+DOCX_TYPES = frozenset({"docx", "doc"})
+IMAGE_TYPES = frozenset({"png", "jpg", "jpeg", "gif", "webp"})
+
+# Characters of document text put in a prompt. Sources are cut before decoding/extracting
+# so the unused tail of a large file is never processed.
+DOCX_TEXT_LIMIT = 50000
+COMPARISON_TEXT_LIMIT = 30000
+TEXT_BYTES_LIMIT = 200_000
+
+# Extracted DOCX text by content digest: summarize -> pros/cons -> report on one file parses it once.
+# Base64 is not cached - hashing the bytes costs more than the SIMD encode it would save.
+DOCX_TEXT_CACHE_SIZE = 32
+_docx_text_cache = LRUCache(maxsize=DOCX_TEXT_CACHE_SIZE)
+_docx_text_cache_lock = threading.Lock()
+# DOCX text is read straight from word/document.xml with compiled XPath instead of python-docx's
+# per-element wrapper objects. Entities are never resolved in uploaded XML.
+W_NS = {"w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main"}
+DOCX_XML_PARSER = etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+# Run content in document order, matching python-docx's Paragraph.text: only runs directly
+# under the paragraph or a hyperlink (text boxes, tracked insertions etc. are left out)
+_docx_run_content = etree.XPath(
+    "(w:r | w:hyperlink/w:r)/*[self::w:t or self::w:tab or self::w:ptab or self::w:br or self::w:cr or self::w:noBreakHyphen]",
+    namespaces=W_NS)
+W_T = f"{{{W_NS['w']}}}t"
+W_BR = f"{{{W_NS['w']}}}br"
+W_BR_TYPE = f"{{{W_NS['w']}}}type"
+# Text equivalents of the other run elements; a w:br is a newline only for a text-wrapping break
+DOCX_RUN_CHARS = {
+    f"{{{W_NS['w']}}}tab": "\t",
+    f"{{{W_NS['w']}}}ptab": "\t",
+    f"{{{W_NS['w']}}}cr": "\n",
+    f"{{{W_NS['w']}}}noBreakHyphen": "-",
+}
 
 def extract_text_from_docx(file_data: bytes) -> str:
-    """Extract text from DOCX file"""
+    """Extract text from DOCX file (cached by content)"""
+    key = hashlib.blake2b(file_data, digest_size=16).digest()
+    with _docx_text_cache_lock:
+        text = _docx_text_cache.get(key)
+    if text is None:
+        text = _parse_docx_text(file_data)
+        with _docx_text_cache_lock:
+            _docx_text_cache[key] = text
+    return text
+
+def _parse_docx_text(file_data: bytes) -> str:
     try:
-        from docx import Document
-        doc = Document(io.BytesIO(file_data))
+        with zipfile.ZipFile(io.BytesIO(file_data)) as archive:
+            body = etree.fromstring(archive.read("word/document.xml"), DOCX_XML_PARSER).find("w:body", W_NS)
         text_parts = []
-        for para in doc.paragraphs:
-            if para.text.strip():
-                text_parts.append(para.text)
-        # Also extract from tables
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = [cell.text.strip() for cell in row.cells if cell.text.strip()]
-                if row_text:
-                    text_parts.append(" | ".join(row_text))
+        text_length = 0
+        for para in body.iterfind("w:p", W_NS):
+            text = _docx_para_text(para)
+            if text.strip():
+                text_parts.append(text)
+                text_length += len(text) + 2
+                if text_length > DOCX_TEXT_LIMIT:
+                    break
+        # Also extract from tables - unless the paragraphs already fill everything a prompt keeps
+        if text_length <= DOCX_TEXT_LIMIT:
+            for row in body.iterfind("w:tbl/w:tr", W_NS):
+                line = " | ".join(filter(None, map(_docx_cell_text, row.iterfind("w:tc", W_NS))))
+                if line:
+                    text_parts.append(line)
+                    text_length += len(line) + 2
+                    if text_length > DOCX_TEXT_LIMIT:
+                        break
         return "\n\n".join(text_parts)
     except Exception as e:
         print(f"Error extracting DOCX text: {e}")
         return ""
 
+def _docx_para_text(para) -> str:
+    parts = []
+    for el in _docx_run_content(para):
+        if el.tag == W_T:
+            parts.append(el.text or "")
+        elif el.tag == W_BR:
+            if el.get(W_BR_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        else:
+            parts.append(DOCX_RUN_CHARS[el.tag])
+    return "".join(parts)
+
+def _docx_cell_text(cell) -> str:
+    return "\n".join([_docx_para_text(p) for p in cell.iterfind("w:p", W_NS)]).strip()
+
+def decode_head(data: bytes, max_bytes: int) -> str:
+    """UTF-8 text of the first max_bytes of data; like bytes.decode, raises UnicodeDecodeError for non-text"""
+    head = data[:max_bytes]
+    try:
+        return head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Only forgive a multi-byte character split by the cut itself
+        if len(head) < len(data) and e.end == len(head) and e.reason == "unexpected end of data":
+            return head[:e.start].decode("utf-8")
+        raise
+
+def data_uri(mime_type: str, data: bytes) -> orjson.Fragment:
+    """The quoted JSON string "data:<mime>;base64,..." for a file, as a fragment orjson copies verbatim.
+    Built in one join over the encoded bytes - no str decode, no f-string copy, no escape scan."""
+    encoded = pybase64.b64encode(data) if pybase64 is not None else base64.b64encode(data)
+    return orjson.Fragment(b"".join((b'"data:', mime_type.encode(), b";base64,", encoded, b'"')))
+
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "doc": "application/msword",
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "txt": "text/plain",
+    "csv": "text/csv",
+    "md": "text/markdown",
+}
+DEFAULT_MIME_TYPE = "application/octet-stream"
+
 def get_mime_type(file_type: str) -> str:
-    mime_types = {
-        "pdf": "application/pdf",
-        "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        "doc": "application/msword",
-        "png": "image/png",
-        "jpg": "image/jpeg",
-        "jpeg": "image/jpeg",
-        "gif": "image/gif",
-        "webp": "image/webp",
-        "txt": "text/plain",
-        "csv": "text/csv",
-        "md": "text/markdown",
-    }
-    return mime_types.get(file_type.lower(), "application/octet-stream")
+    return MIME_TYPES.get(file_type.lower(), DEFAULT_MIME_TYPE)
 
 def build_file_content(file_data: bytes, filename: str, file_type: str):
     """Build content array for API request"""
     
+    file_type = file_type.lower()
     # Handle DOCX - extract text since Claude doesn't support DOCX files directly
-    if file_type.lower() in ["docx", "doc"]:
+    if file_type in DOCX_TYPES:
         text_content = extract_text_from_docx(file_data)
         if text_content:
-            return [{"type": "text", "text": f"Analyze this document:\n\nFilename: {filename}\n\nContent:\n{text_content[:50000]}"}], TEXT_MODEL
+            return [{"type": "text", "text": f"Analyze this document:\n\nFilename: {filename}\n\nContent:\n{text_content[:DOCX_TEXT_LIMIT]}"}], TEXT_MODEL
         else:
             return [{"type": "text", "text": f"Unable to extract text from: {filename}"}], TEXT_MODEL
     
-    base64_data = base64.b64encode(file_data).decode("utf-8")
-    mime_type = get_mime_type(file_type)
-    
-    if file_type.lower() in ["png", "jpg", "jpeg", "gif", "webp"]:
+    if file_type in IMAGE_TYPES:
         return [
             {"type": "text", "text": f"Analyze this image: {filename}"},
-            {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_data}"}}
+            {"type": "image_url", "image_url": {"url": data_uri(MIME_TYPES[file_type], file_data)}}
         ], TEXT_MODEL
-    elif file_type.lower() == "pdf":
+    elif file_type == "pdf":
         return [
             {"type": "text", "text": f"Analyze this document: {filename}"},
-            {"type": "file", "file": {"filename": filename, "file_data": f"data:{mime_type};base64,{base64_data}"}}
+            {"type": "file", "file": {"filename": filename, "file_data": data_uri(MIME_TYPES["pdf"], file_data)}}
         ], PDF_MODEL
     else:
         try:
-            text_content = file_data.decode("utf-8")
+            text_content = decode_head(file_data, TEXT_BYTES_LIMIT)
             return [{"type": "text", "text": f"Analyze this document:\n\nFilename: {filename}\n\nContent:\n{text_content}"}], TEXT_MODEL
         except:
             return [{"type": "text", "text": f"Unable to read file: {filename}"}], TEXT_MODEL
 
+# One pooled client for every OpenRouter call: TLS connections stay warm between requests
+# and concurrent calls share them over HTTP/2 instead of opening a socket each
+_client: Optional[httpx.AsyncClient] = None
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=180.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            # Same on every call, so set once instead of rebuilding the dict per request
+            headers={
+                "Authorization": f"Bearer {API_KEY}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://analysisdoc.app",
+                "X-Title": "AnalysisDoc Web",
+            },
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+# Rate limiting and server-side failures are worth another attempt; other 4xx are not
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+# Longest server-requested Retry-After honoured before giving up on the hint
+RETRY_AFTER_MAX = 30.0
+
+def retry_delay(attempt: int, retry_after: str = None) -> float:
+    """Seconds to wait before the next attempt: the server's Retry-After, else exponential backoff with jitter"""
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_AFTER_MAX)
+        except ValueError:
+            pass
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) + random.uniform(0, 0.25)
+
+def extract_json(text: str):
+    """Parse the outermost {...} of a reply that wrapped its JSON in prose or a code fence; None if that fails"""
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        return orjson.loads(text[start:end + 1])
+    except orjson.JSONDecodeError:
+        return None
+
 async def call_openrouter(system_prompt: str, content: list, model: str, retries: int = 2) -> dict:
     """Make API call to OpenRouter with retry logic"""
     last_error = None
+    # Encode the body once: it embeds the base64 file, so re-encoding it per retry is a full extra copy
+    body = orjson.dumps({
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": content}
+        ],
+        "response_format": {"type": "json_object"},
+    })
     
     for attempt in range(retries + 1):
         try:
-            async with httpx.AsyncClient(timeout=180.0) as client:
-                response = await client.post(
-                    OPENROUTER_API_URL,
-                    headers={
-                        "Authorization": f"Bearer {API_KEY}",
-                        "Content-Type": "application/json",
-                        "HTTP-Referer": "https://analysisdoc.app",
-                        "X-Title": "AnalysisDoc Web",
-                    },
-                    json={
-                        "model": model,
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": content}
-                        ],
-                        "response_format": {"type": "json_object"},
-                    }
-                )
+            response = await get_client().post(OPENROUTER_API_URL, content=body)
+            
+            if response.status_code != 200:
+                error_text = response.text
+                print(f"OpenRouter API error (attempt {attempt + 1}): {response.status_code} - {error_text[:500]}")
+                last_error = Exception(f"OpenRouter API error: {response.status_code}")
+                # Other 4xx (bad request, auth, payload too large) fail the same way on every attempt
+                if attempt < retries and response.status_code in RETRYABLE_STATUS:
+                    await asyncio.sleep(retry_delay(attempt, response.headers.get("Retry-After")))
+                    continue
+                raise last_error
+            
+            data = orjson.loads(response.content)
+            
+            # Check if we have valid response
+            choices = data.get("choices")
+            message = choices[0].get("message") if choices else None
+            if not message:
+                print(f"Invalid response structure (attempt {attempt + 1}): {str(data)[:500]}")
+                last_error = Exception("Invalid API response structure")
+                if attempt < retries:
+                    continue
+                raise last_error
+            
+            content_str = message.get("content")
+            
+            # Handle empty content
+            if not content_str or content_str.strip() == "":
+                print(f"Empty content received (attempt {attempt + 1})")
+                last_error = Exception("Empty response from AI")
+                if attempt < retries:
+                    continue
+                raise last_error
+            
+            # Try to parse JSON
+            try:
+                return orjson.loads(content_str)
+            except orjson.JSONDecodeError as e:
+                print(f"JSON parse error (attempt {attempt + 1}): {str(e)}")
+                print(f"Content received: {content_str[:500]}")
+                # Try to extract JSON from the response
+                extracted = extract_json(content_str)
+                if extracted is not None:
+                    return extracted
+                last_error = Exception(f"Failed to parse AI response as JSON")
+                if attempt < retries:
+                    continue
+                raise last_error
                 
-                if response.status_code != 200:
-                    error_text = response.text
-                    print(f"OpenRouter API error (attempt {attempt + 1}): {response.status_code} - {error_text[:500]}")
-                    last_error = Exception(f"OpenRouter API error: {response.status_code}")
-                    if attempt < retries:
-                        continue
-                    raise last_error
-                
-                data = response.json()
-                
-                # Check if we have valid response
-                if not data.get("choices") or not data["choices"][0].get("message"):
-                    print(f"Invalid response structure (attempt {attempt + 1}): {str(data)[:500]}")
-                    last_error = Exception("Invalid API response structure")
-                    if attempt < retries:
-                        continue
-                    raise last_error
-                
-                content_str = data["choices"][0]["message"]["content"]
-                
-                # Handle empty content
-                if not content_str or content_str.strip() == "":
-                    print(f"Empty content received (attempt {attempt + 1})")
-                    last_error = Exception("Empty response from AI")
-                    if attempt < retries:
-                        continue
-                    raise last_error
-                
-                # Try to parse JSON
-                try:
-                    return json.loads(content_str)
-                except json.JSONDecodeError as e:
-                    print(f"JSON parse error (attempt {attempt + 1}): {str(e)}")
-                    print(f"Content received: {content_str[:500]}")
-                    # Try to extract JSON from the response
-                    import re
-                    json_match = re.search(r'\{[\s\S]*\}', content_str)
-                    if json_match:
-                        try:
-                            return json.loads(json_match.group())
-                        except:
-                            pass
-                    last_error = Exception(f"Failed to parse AI response as JSON")
-                    if attempt < retries:
-                        continue
-                    raise last_error
-                    
         except httpx.TimeoutException:
             print(f"Timeout (attempt {attempt + 1})")
             last_error = Exception("Request timed out")
             if attempt < retries:
+                await asyncio.sleep(retry_delay(attempt))
                 continue
             raise last_error
         except Exception as e:
@@ -165,6 +313,7 @@ async def call_openrouter(system_prompt: str, content: list, model: str, retries
             print(f"Unexpected error (attempt {attempt + 1}): {str(e)}")
             last_error = e
             if attempt < retries:
+                await asyncio.sleep(retry_delay(attempt))
                 continue
             raise
     
@@ -172,10 +321,7 @@ async def call_openrouter(system_prompt: str, content: list, model: str, retries
 
 # ============ ANALYSIS FUNCTIONS ============
 
-async def analyze_summarize(file_data: bytes, filename: str, file_type: str) -> dict:
-    """Summarize a document"""
-    content, model = build_file_content(file_data, filename, file_type)
-    prompt = """You are a document analysis expert. Analyze the document and return JSON:
+SUMMARIZE_PROMPT = """You are a document analysis expert. Analyze the document and return JSON:
 {
     "title": "Document title",
     "summary": "Comprehensive summary paragraph",
@@ -192,12 +338,8 @@ async def analyze_summarize(file_data: bytes, filename: str, file_type: str) ->
     "word_count": 0
 }
 Be thorough. Include confidence scores (0.0-1.0) for each key point."""
-    return await call_openrouter(prompt, content, model)
 
-async def analyze_pros_cons(file_data: bytes, filename: str, file_type: str) -> dict:
-    """Generate pros and cons analysis"""
-    content, model = build_file_content(file_data, filename, file_type)
-    prompt = """Analyze the document for pros and cons. Return JSON:
+PROS_CONS_PROMPT = """Analyze the document for pros and cons. Return JSON:
 {
     "title": "Document title",
     "summary": "Brief overview",
@@ -211,12 +353,8 @@ async def analyze_pros_cons(file_data: bytes, filename: str, file_type: str) ->
     "recommendation": "Final recommendation"
 }
 Each pro/con MUST have a citation with page number and quote."""
-    return await call_openrouter(prompt, content, model)
 
-async def analyze_gaps_risks(file_data: bytes, filename: str, file_type: str) -> dict:
-    """Identify gaps and risks"""
-    content, model = build_file_content(file_data, filename, file_type)
-    prompt = """Analyze the document for gaps and risks. Return JSON:
+GAPS_RISKS_PROMPT = """Analyze the document for gaps and risks. Return JSON:
 {
     "title": "Document title",
     "summary": "Brief overview",
@@ -230,12 +368,8 @@ async def analyze_gaps_risks(file_data: bytes, filename: str, file_type: str) ->
     "missing_sections": ["List of missing sections"],
     "improvement_priority": ["Ordered list of improvements"]
 }"""
-    return await call_openrouter(prompt, content, model)
 
-async def analyze_upgrade_suggestions(file_data: bytes, filename: str, file_type: str) -> dict:
-    """Generate upgrade suggestions"""
-    content, model = build_file_content(file_data, filename, file_type)
-    prompt = """Analyze the document and suggest improvements. Return JSON:
+UPGRADE_PROMPT = """Analyze the document and suggest improvements. Return JSON:
 {
     "title": "Document title",
     "current_quality_score": 70,
@@ -253,13 +387,8 @@ async def analyze_upgrade_suggestions(file_data: bytes, filename: str, file_type
     "major_improvements": ["Significant changes needed"],
     "potential_quality_score": 90
 }"""
-    return await call_openrouter(prompt, content, model)
 
-async def analyze_qa(file_data: bytes, filename: str, file_type: str, question: str) -> dict:
-    """Answer a question about the document"""
-    content, model = build_file_content(file_data, filename, file_type)
-    content[0]["text"] = f"Document: {filename}\n\nQuestion: {question}"
-    prompt = """Answer the question based on the document. Return JSON:
+QA_PROMPT = """Answer the question based on the document. Return JSON:
 {
     "question": "The question asked",
     "answer": "Detailed answer based on document content",
@@ -272,12 +401,14 @@ async def analyze_qa(file_data: bytes, filename: str, file_type: str, question:
     "warning": null
 }
 If the question cannot be answered from the document, set warning to explain why and provide best effort answer."""
-    return await call_openrouter(prompt, content, model)
 
-async def generate_chart_data(file_data: bytes, filename: str, file_type: str, chart_type: str = "bar") -> dict:
-    """Extract data for chart generation"""
+async def analyze_qa(file_data: bytes, filename: str, file_type: str, question: str) -> dict:
+    """Answer a question about the document"""
     content, model = build_file_content(file_data, filename, file_type)
-    prompt = f"""Extract numeric data from the document suitable for a {chart_type} chart. Return JSON:
+    content[0]["text"] = f"Document: {filename}\n\nQuestion: {question}"
+    return await call_openrouter(QA_PROMPT, content, model)
+
+CHART_PROMPT_TEMPLATE = """Extract numeric data from the document suitable for a {chart_type} chart. Return JSON:
 {{
     "title": "Chart title",
     "chart_type": "{chart_type}",
@@ -292,42 +423,34 @@ async def generate_chart_data(file_data: bytes, filename: str, file_type: str, c
     "alternative_charts": ["Other suitable chart types"]
 }}
 Extract meaningful numeric data. If no numeric data found, create summary statistics."""
+
+async def generate_chart_data(file_data: bytes, filename: str, file_type: str, chart_type: str = "bar") -> dict:
+    """Extract data for chart generation"""
+    content, model = build_file_content(file_data, filename, file_type)
+    prompt = CHART_PROMPT_TEMPLATE.format(chart_type=chart_type)
     return await call_openrouter(prompt, content, model)
 
 # ============ COMPARISON FUNCTIONS ============
 
 def build_comparison_content(doc_data: bytes, doc_name: str, doc_type: str, version_label: str):
     """Build content for a single document in comparison"""
-    if doc_type.lower() in ["docx", "doc"]:
+    doc_type = doc_type.lower()
+    if doc_type in DOCX_TYPES:
         text_content = extract_text_from_docx(doc_data)
         if text_content:
-            return {"type": "text", "text": f"\n\n--- {version_label}: {doc_name} ---\n{text_content[:30000]}"}
+            return {"type": "text", "text": f"\n\n--- {version_label}: {doc_name} ---\n{text_content[:COMPARISON_TEXT_LIMIT]}"}
         return {"type": "text", "text": f"\n\n--- {version_label}: {doc_name} ---\n[Unable to extract text]"}
-    elif doc_type.lower() == "pdf":
-        base64_data = base64.b64encode(doc_data).decode("utf-8")
-        mime_type = get_mime_type(doc_type)
-        return {"type": "file", "file": {"filename": f"{version_label}: {doc_name}", "file_data": f"data:{mime_type};base64,{base64_data}"}}
+    elif doc_type == "pdf":
+        return {"type": "file", "file": {"filename": f"{version_label}: {doc_name}", "file_data": data_uri(MIME_TYPES["pdf"], doc_data)}}
     else:
         try:
-            text_content = doc_data.decode("utf-8")
-            return {"type": "text", "text": f"\n\n--- {version_label}: {doc_name} ---\n{text_content[:30000]}"}
+            # A character is at most 4 UTF-8 bytes, so this many bytes always covers the limit
+            text_content = decode_head(doc_data, COMPARISON_TEXT_LIMIT * 4)
+            return {"type": "text", "text": f"\n\n--- {version_label}: {doc_name} ---\n{text_content[:COMPARISON_TEXT_LIMIT]}"}
         except:
             return {"type": "text", "text": f"\n\n--- {version_label}: {doc_name} ---\n[Unable to read]"}
 
-async def compare_two_documents(doc1_data: bytes, doc1_name: str, doc1_type: str,
-                                 doc2_data: bytes, doc2_name: str, doc2_type: str) -> dict:
-    """Compare two documents with detailed table format"""
-    content = [{"type": "text", "text": f"Compare these two documents in detail:\nDocument 1: {doc1_name}\nDocument 2: {doc2_name}"}]
-    
-    # Add documents based on their type
-    content.append(build_comparison_content(doc1_data, doc1_name, doc1_type, "Document 1"))
-    content.append(build_comparison_content(doc2_data, doc2_name, doc2_type, "Document 2"))
-    
-    # Use PDF model only if we have PDF files, otherwise use text model
-    has_pdf = doc1_type.lower() == "pdf" or doc2_type.lower() == "pdf"
-    model = PDF_MODEL if has_pdf else TEXT_MODEL
-    
-    prompt = """Compare the two documents thoroughly with detailed analysis. Return JSON:
+COMPARE_TWO_PROMPT = """Compare the two documents thoroughly with detailed analysis. Return JSON:
 {
     "document1": {"name": "Doc 1 name", "summary": "Detailed summary of document 1", "key_points": ["point1", "point2"]},
     "document2": {"name": "Doc 2 name", "summary": "Detailed summary of document 2", "key_points": ["point1", "point2"]},
@@ -360,21 +483,31 @@ async def compare_two_documents(doc1_data: bytes, doc1_name: str, doc1_type: str
     "best_version_reason": "Detailed explanation of why this document is better",
     "recommendation": "Final recommendation for which document to use and why"
 }"""
-    return await call_openrouter(prompt, content, model)
 
-async def compare_multiple_documents(documents: list) -> dict:
-    """Compare multiple documents with detailed table format"""
-    content = [{"type": "text", "text": f"Compare these {len(documents)} documents in detail:"}]
+async def build_comparison_parts(documents: list) -> list:
+    """build_comparison_content for each document, run side by side on worker threads
+    (DOCX parsing and base64 encoding are independent per document)"""
+    return await asyncio.gather(*(
+        asyncio.to_thread(build_comparison_content, doc["data"], doc["name"], doc["type"], f"Document {i+1}")
+        for i, doc in enumerate(documents)
+    ))
+
+async def compare_two_documents(doc1_data: bytes, doc1_name: str, doc1_type: str,
+                                 doc2_data: bytes, doc2_name: str, doc2_type: str) -> dict:
+    """Compare two documents with detailed table format"""
+    content = [{"type": "text", "text": f"Compare these two documents in detail:\nDocument 1: {doc1_name}\nDocument 2: {doc2_name}"}]
     
-    has_pdf = False
-    for i, doc in enumerate(documents):
-        content.append(build_comparison_content(doc["data"], doc["name"], doc["type"], f"Document {i+1}"))
-        if doc["type"].lower() == "pdf":
-            has_pdf = True
+    # Add documents based on their type
+    content.append(build_comparison_content(doc1_data, doc1_name, doc1_type, "Document 1"))
+    content.append(build_comparison_content(doc2_data, doc2_name, doc2_type, "Document 2"))
     
+    # Use PDF model only if we have PDF files, otherwise use text model
+    has_pdf = "pdf" in (doc1_type.lower(), doc2_type.lower())
     model = PDF_MODEL if has_pdf else TEXT_MODEL
     
-    prompt = """Compare all documents thoroughly with detailed analysis. Return JSON:
+    return await call_openrouter(COMPARE_TWO_PROMPT, content, model)
+
+COMPARE_MULTIPLE_PROMPT = """Compare all documents thoroughly with detailed analysis. Return JSON:
 {
     "documents": [
         {"id": 1, "name": "filename", "summary": "Detailed summary", "key_points": ["point1", "point2"], "quality_score": 80}
@@ -406,29 +539,19 @@ async def compare_multiple_documents(documents: list) -> dict:
     },
     "recommendation": "Final detailed recommendation"
 }"""
-    return await call_openrouter(prompt, content, model)
 
-# ============ DECISION MATRIX ============
-
-async def build_decision_matrix(documents: list, criteria: list) -> dict:
-    """Build a detailed decision matrix comparing documents against criteria"""
-    content = [{"type": "text", "text": f"Evaluate these {len(documents)} documents/options against the following criteria:\n\nCriteria:\n"}]
-    
-    for c in criteria:
-        content[0]["text"] += f"- {c['name']} (weight: {c['weight']}): {c.get('description', '')}\n"
-    
-    content[0]["text"] += "\nDocuments to evaluate:"
-    
-    has_pdf = False
-    for i, doc in enumerate(documents):
-        content.append(build_comparison_content(doc["data"], doc["name"], doc["type"], f"Document {i+1}"))
-        if doc["type"].lower() == "pdf":
-            has_pdf = True
+async def compare_multiple_documents(documents: list) -> dict:
+    """Compare multiple documents with detailed table format"""
+    content = [{"type": "text", "text": f"Compare these {len(documents)} documents in detail:"}]
     
-    model = PDF_MODEL if has_pdf else TEXT_MODEL
+    content.extend(await build_comparison_parts(documents))
+    model = PDF_MODEL if any(doc["type"].lower() == "pdf" for doc in documents) else TEXT_MODEL
     
-    criteria_json = json.dumps(criteria)
-    prompt = f"""Evaluate each document against ALL criteria with detailed scoring. Criteria: {criteria_json}
+    return await call_openrouter(COMPARE_MULTIPLE_PROMPT, content, model)
+
+# ============ DECISION MATRIX ============
+
+DECISION_MATRIX_PROMPT_TEMPLATE = """Evaluate each document against ALL criteria with detailed scoring. Criteria: {criteria_json}
 
 Return JSON with DETAILED analysis:
 {{
@@ -488,14 +611,24 @@ Return JSON with DETAILED analysis:
 }}
 
 Score each document 0-10 per criterion. Calculate weighted totals (score * weight). Be thorough and detailed in your analysis."""
+
+async def build_decision_matrix(documents: list, criteria: list) -> dict:
+    """Build a detailed decision matrix comparing documents against criteria"""
+    lines = [f"Evaluate these {len(documents)} documents/options against the following criteria:\n\nCriteria:\n"]
+    lines.extend(f"- {c['name']} (weight: {c['weight']}): {c.get('description', '')}\n" for c in criteria)
+    lines.append("\nDocuments to evaluate:")
+    content = [{"type": "text", "text": "".join(lines)}]
+    
+    content.extend(await build_comparison_parts(documents))
+    model = PDF_MODEL if any(doc["type"].lower() == "pdf" for doc in documents) else TEXT_MODEL
+    
+    criteria_json = orjson.dumps(criteria).decode()
+    prompt = DECISION_MATRIX_PROMPT_TEMPLATE.format(criteria_json=criteria_json)
     return await call_openrouter(prompt, content, model)
 
 # ============ REPORT GENERATION ============
 
-async def generate_report(file_data: bytes, filename: str, file_type: str) -> dict:
-    """Generate a comprehensive analysis report"""
-    content, model = build_file_content(file_data, filename, file_type)
-    prompt = """Generate a comprehensive analysis report. Return JSON:
+REPORT_PROMPT = """Generate a comprehensive analysis report. Return JSON:
 {
     "title": "Report title",
     "executive_summary": "Executive summary paragraph",
@@ -529,12 +662,8 @@ async def generate_report(file_data: bytes, filename: str, file_type: str) -> di
         "data_sources": ["Source references"]
     }
 }"""
-    return await call_openrouter(prompt, content, model)
 
-async def generate_slides(file_data: bytes, filename: str, file_type: str) -> dict:
-    """Generate presentation slides outline"""
-    content, model = build_file_content(file_data, filename, file_type)
-    prompt = """Create a presentation slides outline. Return JSON:
+SLIDES_PROMPT = """Create a presentation slides outline. Return JSON:
 {
     "title": "Presentation title",
     "subtitle": "Subtitle",
@@ -554,40 +683,38 @@ async def generate_slides(file_data: bytes, filename: str, file_type: str) -> di
     "visual_suggestions": ["Suggested visuals/graphics"]
 }
 Create 8-12 slides covering the document comprehensively."""
-    return await call_openrouter(prompt, content, model)
 
 # ============ MAIN ANALYZE FUNCTION ============
 
+# Analyses that are just a fixed prompt over the document; unknown types fall back to summarize
+ANALYSIS_PROMPTS = {
+    "summarize": SUMMARIZE_PROMPT,
+    "pros_cons": PROS_CONS_PROMPT,
+    "gaps_risks": GAPS_RISKS_PROMPT,
+    "upgrade": UPGRADE_PROMPT,
+    "report": REPORT_PROMPT,
+    "slides": SLIDES_PROMPT,
+}
+
+async def run_prompt(prompt: str, file_data: bytes, filename: str, file_type: str) -> dict:
+    """Send one document with a system prompt"""
+    content, model = build_file_content(file_data, filename, file_type)
+    return await call_openrouter(prompt, content, model)
+
 async def analyze_document(file_data: bytes, filename: str, file_type: str, analysis_type: str = "summarize", **kwargs) -> dict:
     """Main entry point for document analysis"""
-    if analysis_type == "summarize":
-        return await analyze_summarize(file_data, filename, file_type)
-    elif analysis_type == "pros_cons":
-        return await analyze_pros_cons(file_data, filename, file_type)
-    elif analysis_type == "gaps_risks":
-        return await analyze_gaps_risks(file_data, filename, file_type)
-    elif analysis_type == "upgrade":
-        return await analyze_upgrade_suggestions(file_data, filename, file_type)
-    elif analysis_type == "qa":
+    if analysis_type == "qa":
         question = kwargs.get("question", "What is this document about?")
         return await analyze_qa(file_data, filename, file_type, question)
     elif analysis_type == "chart":
         chart_type = kwargs.get("chart_type", "bar")
         return await generate_chart_data(file_data, filename, file_type, chart_type)
-    elif analysis_type == "report":
-        return await generate_report(file_data, filename, file_type)
-    elif analysis_type == "slides":
-        return await generate_slides(file_data, filename, file_type)
-    else:
-        return await analyze_summarize(file_data, filename, file_type)
+    return await run_prompt(ANALYSIS_PROMPTS.get(analysis_type, SUMMARIZE_PROMPT), file_data, filename, file_type)
 
 
 # ============ SMART SUGGESTIONS ============
 
-async def get_analysis_suggestions(file_data: bytes, filename: str, file_type: str) -> dict:
-    """Analyze document ONCE and get all suggestions - saves API credits"""
-    content, model = build_file_content(file_data, filename, file_type)
-    prompt = """Analyze this document comprehensively and provide suggestions for all possible analyses.
+SUGGESTIONS_PROMPT = """Analyze this document comprehensively and provide suggestions for all possible analyses.
 
 Return JSON:
 {
@@ -665,4 +792,7 @@ Return JSON:
 }
 
 Provide ALL analysis types with relevance scores (0.0-1.0). Be thorough but concise."""
-    return await call_openrouter(prompt, content, model)
+
+async def get_analysis_suggestions(file_data: bytes, filename: str, file_type: str) -> dict:
+    """Analyze document ONCE and get all suggestions - saves API credits"""
+    return await run_prompt(SUGGESTIONS_PROMPT, file_data, filename, file_type)
@@ -0,0 +1,64 @@
+"""DOCX text extraction must match python-docx's Paragraph.text / table cell text"""
+import io
+import unittest
+
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+import openrouter_service
+
+def paragraph_xml(inner: str):
+    return parse_xml(f'<w:p {nsdecls("w")} xmlns:v="urn:schemas-microsoft-com:vml">{inner}</w:p>')
+
+def build_docx(paragraph_inner: list, cells: list) -> bytes:
+    doc = Document()
+    for inner in paragraph_inner:
+        doc.element.body.append(paragraph_xml(inner))
+    table = doc.add_table(rows=1, cols=len(cells))
+    for cell, inner in zip(table.rows[0].cells, cells):
+        cell._tc.remove(cell._tc.p_lst[0])
+        cell._tc.append(paragraph_xml(inner))
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+def python_docx_text(file_data: bytes) -> str:
+    """The extraction this module used to do with python-docx objects"""
+    doc = Document(io.BytesIO(file_data))
+    parts = [p.text for p in doc.paragraphs if p.text.strip()]
+    for table in doc.tables:
+        for row in table.rows:
+            row_text = [cell.text.strip() for cell in row.cells if cell.text.strip()]
+            if row_text:
+                parts.append(" | ".join(row_text))
+    return "\n\n".join(parts)
+
+PARAGRAPHS = [
+    # tab and line break inside runs
+    "<w:r><w:t>Name</w:t><w:tab/><w:t>Value</w:t></w:r><w:r><w:t>Line1</w:t><w:br/><w:t>Line2</w:t></w:r>",
+    # carriage return, page break (no text), positional tab, non-breaking hyphen
+    "<w:r><w:t>A</w:t><w:cr/><w:t>B</w:t><w:br w:type=\"page\"/><w:t>C</w:t><w:ptab w:relativeTo=\"margin\" w:alignment=\"right\" w:leader=\"none\"/><w:t>D</w:t><w:noBreakHyphen/><w:t>E</w:t></w:r>",
+    # hyperlink runs are included
+    "<w:r><w:t xml:space=\"preserve\">See </w:t></w:r><w:hyperlink><w:r><w:t>the docs</w:t></w:r></w:hyperlink>",
+    # text box content is not part of the paragraph text
+    "<w:r><w:t>Body</w:t><w:pict><v:shape><v:textbox><w:txbxContent><w:p><w:r><w:t>Boxed</w:t></w:r></w:p></w:txbxContent></v:textbox></v:shape></w:pict></w:r>",
+    # whitespace-only paragraphs are skipped
+    "<w:r><w:tab/></w:r>",
+]
+
+CELLS = [
+    "<w:r><w:t>Key</w:t><w:tab/><w:t>1</w:t></w:r>",
+    "<w:r><w:t>x</w:t><w:br/><w:t>y</w:t></w:r>",
+]
+
+class DocxTextTest(unittest.TestCase):
+    def test_matches_python_docx(self):
+        file_data = build_docx(PARAGRAPHS, CELLS)
+        expected = python_docx_text(file_data)
+        self.assertIn("Name\tValueLine1\nLine2", expected)
+        self.assertNotIn("Boxed", expected)
+        self.assertEqual(openrouter_service._parse_docx_text(file_data), expected)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -123,9 +123,25 @@ function viewWorkspace(id) {
 }
 
 // ============ Documents ============
+// /documents returns one newest-first page; follow the cursor to fetch them all.
+// The backend pages on (created_at, id) and the serverless API on after_id, so send both.
+const DOCUMENTS_PAGE_SIZE = 200;
+
+async function fetchAllDocuments() {
+    const docs = [];
+    let cursor = '';
+    while (true) {
+        const page = await api(`/documents?limit=${DOCUMENTS_PAGE_SIZE}${cursor}`);
+        docs.push(...page);
+        if (page.length < DOCUMENTS_PAGE_SIZE) return docs;
+        const last = page[page.length - 1];
+        cursor = `&before=${encodeURIComponent(last.created_at)}&before_id=${last.id}&after_id=${last.id}`;
+    }
+}
+
 async function loadDocuments() {
     try {
-        state.documents = await api('/documents');
+        state.documents = await fetchAllDocuments();
         renderDocuments();
         renderRecentDocs();
     } catch (e) { showToast('Failed to load documents', 'error'); }
@@ -0,0 +1,60 @@
+"""Paging input handling of the serverless handler (api/index.py)"""
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "api"))
+# No database here: the cold-start warm-up thread is skipped in gateway mode
+os.environ.setdefault("DB_HTTP_URL", "http://gateway.invalid")
+
+import index
+
+def get(path, query_string=b""):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(index.app({"type": "http", "method": "GET", "path": path, "query_string": query_string}, receive, send))
+    return messages[0]["status"], b"".join(m.get("body", b"") for m in messages[1:])
+
+class PagingTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+        def fetch_all(sql, params=None, prepared=False):
+            self.calls.append(params)
+            return [{"id": 3}, {"id": 2}, {"id": 1}][:params[-2] if "OFFSET" in sql else params[-1]]
+
+        self._fetch_all, index.fetch_all = index.fetch_all, fetch_all
+
+    def tearDown(self):
+        index.fetch_all = self._fetch_all
+
+    def test_limit_is_clamped(self):
+        self.assertEqual(index.page_params({"limit": ["0"]})[0], 1)
+        self.assertEqual(index.page_params({"limit": ["-5"]})[0], 1)
+        self.assertEqual(index.page_params({"limit": ["100000"]})[0], index.MAX_PAGE_SIZE)
+
+    def test_offset_is_clamped(self):
+        self.assertEqual(index.page_params({"offset": ["-10"]})[1], 0)
+
+    def test_zero_limit_returns_a_page(self):
+        status, _ = get("/documents", b"limit=0")
+        self.assertEqual(status, 200)
+        self.assertEqual(self.calls[-1], (1, 0))
+
+    def test_non_integers_are_400(self):
+        for query in (b"limit=abc", b"offset=abc", b"after_id=abc"):
+            status, body = get("/documents", query)
+            self.assertEqual(status, 400, query)
+            self.assertIn(b"must be an integer", body)
+        self.assertEqual(get("/qa-history", b"limit=abc")[0], 400)
+        self.assertEqual(self.calls, [])
+
+if __name__ == "__main__":
+    unittest.main()